@@ -0,0 +1,222 @@
+import time
+
+STARTUP_TIME = time.perf_counter()  # Reference point for the startup time measurements, taken before the imports
+
+import argparse
+import asyncio
+import ctypes
+import json
+import logging
+import re
+import sys
+import exclusions
+import inventory
+import powershell_host
+import scheduling
+import settings
+import tracing
+from engine import UpdateEngine, PER_APP, BATCH, UPDATED, UP_TO_DATE, CANCELLED
+from history import FAILURE_OUTCOMES
+
+MODES = (PER_APP, BATCH)
+HTML_TAG = re.compile(r"<[^>]+>")  # Status messages are formatted for the GUI's status box
+
+
+class ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("page_fault_count", ctypes.c_ulong)] + [
+        (name, ctypes.c_size_t) for name in (
+            "peak_working_set_size", "working_set_size", "quota_peak_paged_pool_usage", "quota_paged_pool_usage",
+            "quota_peak_non_paged_pool_usage", "quota_non_paged_pool_usage", "pagefile_usage", "peak_pagefile_usage")
+    ]
+
+
+def get_peak_memory() -> int | None:
+    """The most memory the process has used so far, in bytes, or None if it could not be measured."""
+    if sys.platform == "win32":
+        counters = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+        kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        psapi.GetProcessMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.peak_working_set_size
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+
+def get_stats(ready) -> dict:
+    """How long the command took to start and to finish, and how much memory it used."""
+    peak_memory = get_peak_memory()
+    return {
+        "startup_seconds": round(ready - STARTUP_TIME, 3),
+        "total_seconds": round(time.perf_counter() - STARTUP_TIME, 3),
+        "peak_memory_mb": round(peak_memory / 1024 ** 2, 1) if peak_memory else None,
+        "qt_loaded": any(module.startswith("PyQt6") for module in sys.modules),
+    }
+
+
+def get_apps(refresh=False) -> list[inventory.AppRecord]:
+    """The installed apps, from the cache while it is fresh."""
+    cache = inventory.load_cached_inventory()
+    if not refresh and inventory.is_cache_fresh(cache, settings.load_settings()["inventory_cache_ttl"]):
+        return cache["apps"]
+    return inventory.refresh_inventory() or (cache["apps"] if cache else [])
+
+
+def get_updates(apps, package_ids=()) -> list[inventory.AppRecord]:
+    """The apps with an available update that are not excluded, only the given ones if any are."""
+    updates = inventory.get_update_list(apps, exclusions.load_exclusions())
+    if package_ids:
+        wanted = {package_id.lower() for package_id in package_ids}
+        updates = [app for app in updates if (app.id or app.name).lower() in wanted]
+    return updates
+
+
+def print_table(rows, headers):
+    """Prints rows of text in aligned columns."""
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in (headers, *rows):
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def list_apps(args) -> int:
+    """Prints the installed apps, or only the ones with updates."""
+    apps = get_apps(args.refresh)
+    if args.updates:
+        apps = get_updates(apps)
+    if args.json:
+        print(json.dumps({"apps": [app.to_dict() for app in apps], "stats": get_stats(args.ready)}, indent=2))
+    else:
+        print_table([(app.name, app.id, app.version, app.available) for app in apps],
+                    ("Name", "Id", "Version", "Available"))
+    return 0
+
+
+def plan_updates(args) -> int:
+    """Prints the order the updates would run in, with how long each is expected to take."""
+    policy = args.policy or settings.load_settings()["schedule_policy"]
+    durations = scheduling.DurationHistory.load()
+    apps = scheduling.order_apps(get_updates(get_apps(args.refresh), args.ids), durations, policy)
+    estimates = durations.estimate_all(apps)
+    eta = scheduling.EtaEstimator(durations, apps).remaining(args.concurrency)
+
+    if args.json:
+        print(json.dumps({
+            "policy": policy,
+            "concurrency": args.concurrency,
+            "apps": [{**app.to_dict(), "estimated_seconds": round(estimate, 1)}
+                     for app, estimate in zip(apps, estimates)],
+            "estimated_seconds": round(eta, 1),
+            "stats": get_stats(args.ready),
+        }, indent=2))
+    else:
+        print_table([(app.name, app.id, f"{app.version} -> {app.available}", f"{estimate:.0f}s")
+                     for app, estimate in zip(apps, estimates)], ("Name", "Id", "Update", "Estimate"))
+        print(f"{len(apps)} updates, about {eta / 60:.0f} min with {args.concurrency} at once")
+    return 0
+
+
+def upgrade_apps(args) -> int:
+    """Updates the given apps, or all of them with --all, printing every event as it happens."""
+    saved = settings.load_settings()
+    if not args.ids and not args.all:
+        print("Name the package ids to update, or pass --all.", file=sys.stderr)
+        return 2
+    apps = get_updates(get_apps(args.refresh), args.ids)
+
+    engine = UpdateEngine(args.concurrency,
+                          update_mode=args.mode or saved["update_mode"],
+                          adaptive=args.adaptive or saved["adaptive_concurrency"],
+                          schedule=args.policy or saved["schedule_policy"],
+                          timeout=saved["update_timeout"],
+                          stall_timeout=saved["stall_timeout"])
+
+    if args.json:
+        def print_event(name):
+            return lambda *values: print(json.dumps({"event": name, "values": values}), flush=True)
+
+        for name in ("update_progress", "update_app_being_processed", "eta_changed", "queue_depth"):
+            getattr(engine, name).connect(print_event(name))
+    else:
+        engine.update_progress.connect(lambda progress, message: print(f"[{progress:3d}%] "
+                                                                       f"{HTML_TAG.sub('', message)}", flush=True))
+        engine.update_app_being_processed.connect(lambda name: print(f"       Processing: {name}", flush=True))
+
+    if apps:
+        try:
+            asyncio.run(engine.check_and_install(apps))
+        except KeyboardInterrupt:
+            engine.stop_requested = True  # Running winget calls were killed when the run was cancelled
+
+    outcomes = engine.outcomes
+    summary = {
+        "updated": sorted(key for key, outcome in outcomes.items() if outcome == UPDATED),
+        "up_to_date": sorted(key for key, outcome in outcomes.items() if outcome == UP_TO_DATE),
+        "failed": sorted(key for key, outcome in outcomes.items() if outcome in FAILURE_OUTCOMES),
+        "stopped": engine.stop_requested,
+    }
+    if args.json:
+        print(json.dumps({"event": "summary", **summary, "outcomes": outcomes, "stats": get_stats(args.ready)}))
+    else:
+        print(f"{len(summary['updated'])} updated, {len(summary['up_to_date'])} already up to date, "
+              f"{len(summary['failed'])} failed")
+
+    if engine.stop_requested or CANCELLED in outcomes.values():
+        return 130
+    return 1 if summary["failed"] else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """The command line arguments of the headless updater."""
+    parser = argparse.ArgumentParser(prog="cli.py", description="Updates apps with winget, without the GUI.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log what the updater does to stderr")
+    parser.add_argument("--stats", action="store_true", help="print the startup time and memory use to stderr")
+    parser.add_argument("--trace", metavar="PATH", help="record every external call to a trace file, "
+                                                        "Chrome trace events if it ends in .json, else JSON lines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="list the installed apps")
+    list_parser.add_argument("--updates", action="store_true", help="only apps with an update that is not skipped")
+    list_parser.set_defaults(func=list_apps)
+
+    plan_parser = commands.add_parser("plan", help="show the order the updates would run in, and how long they take")
+    plan_parser.add_argument("ids", nargs="*", help="package ids to plan, all available updates by default")
+    plan_parser.set_defaults(func=plan_updates)
+
+    upgrade_parser = commands.add_parser("upgrade", help="update apps")
+    upgrade_parser.add_argument("ids", nargs="*", help="package ids to update")
+    upgrade_parser.add_argument("--all", action="store_true", help="update every app with an update not skipped")
+    upgrade_parser.add_argument("--mode", choices=MODES, help="update mode, the GUI's setting by default")
+    upgrade_parser.add_argument("--adaptive", action="store_true", help="run fewer updates at once under load")
+    upgrade_parser.set_defaults(func=upgrade_apps)
+
+    for command in (list_parser, plan_parser, upgrade_parser):
+        command.add_argument("--json", action="store_true", help="print JSON instead of text")
+        command.add_argument("--refresh", action="store_true", help="collect the installed apps, even if cached")
+    for command in (plan_parser, upgrade_parser):
+        command.add_argument("-c", "--concurrency", type=int, default=2, help="apps updated at once (default: 2)")
+        command.add_argument("--policy", choices=scheduling.POLICIES, help="update order, the GUI's setting by default")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.trace:
+        tracing.start_tracing(args.trace)
+    args.ready = time.perf_counter()
+    logging.info(f"Startup: ready after {args.ready - STARTUP_TIME:.3f}s")
+    try:
+        return args.func(args)
+    finally:
+        powershell_host.shutdown_host()
+        tracing.shutdown_tracing()
+        if args.stats:
+            print(json.dumps(get_stats(args.ready)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
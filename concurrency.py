@@ -0,0 +1,231 @@
+import asyncio
+import ctypes
+import logging
+import statistics
+import sys
+from dataclasses import dataclass
+
+
+@dataclass
+class LoadSample:
+    """A single measurement of how busy the system is. Values that could not be measured are None."""
+    cpu_percent: float | None = None
+    disk_queue: float | None = None
+
+
+class AdjustableLimiter:
+    """An asyncio semaphore whose limit can be changed while tasks are waiting on it."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            self.waiting += 1
+            try:
+                await self.condition.wait_for(lambda: self.active < self.limit)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    async def set_limit(self, limit):
+        """Changes the limit. Running tasks finish normally when it shrinks, waiting ones start when it grows."""
+        async with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+
+class SystemLoadSource:
+    """Samples total CPU usage and the disk queue length through Windows performance counters."""
+
+    CPU_COUNTER = r"\Processor(_Total)\% Processor Time"
+    DISK_QUEUE_COUNTER = r"\PhysicalDisk(_Total)\Current Disk Queue Length"
+    PDH_FMT_DOUBLE = 0x00000200
+
+    class CounterValue(ctypes.Structure):
+        _fields_ = [("status", ctypes.c_ulong), ("value", ctypes.c_double)]
+
+    def __init__(self):
+        self.pdh = None
+        self.query = ctypes.c_void_p()
+        self.counters = {}
+        if sys.platform != "win32":
+            return
+
+        try:
+            self.pdh = ctypes.windll.pdh
+            if self.pdh.PdhOpenQueryW(None, None, ctypes.byref(self.query)) != 0:
+                self.pdh = None
+                return
+            for key, path in (("cpu", self.CPU_COUNTER), ("disk", self.DISK_QUEUE_COUNTER)):
+                counter = ctypes.c_void_p()
+                if self.pdh.PdhAddEnglishCounterW(self.query, path, None, ctypes.byref(counter)) == 0:
+                    self.counters[key] = counter
+            self.pdh.PdhCollectQueryData(self.query)  # Rate counters need a first sample to compare against
+        except (AttributeError, OSError) as e:
+            logging.warning(f"Performance counters unavailable: {e}")
+            self.pdh = None
+
+    def read_counter(self, key) -> float | None:
+        """Reads the formatted value of a counter from the last collected sample."""
+        if key not in self.counters:
+            return None
+        value = self.CounterValue()
+        if self.pdh.PdhGetFormattedCounterValue(self.counters[key], self.PDH_FMT_DOUBLE, None,
+                                                ctypes.byref(value)) != 0:
+            return None
+        return value.value
+
+    def __call__(self) -> LoadSample:
+        if self.pdh is None or self.pdh.PdhCollectQueryData(self.query) != 0:
+            return LoadSample()
+        return LoadSample(cpu_percent=self.read_counter("cpu"), disk_queue=self.read_counter("disk"))
+
+
+class AdaptiveConcurrencyController:
+    """Adjusts a limiter at runtime: one more worker while the system has headroom, half as many under pressure."""
+
+    def __init__(self, limiter, min_limit, max_limit, load_source=None, estimate=None, interval=5.0,
+                 cpu_high=85.0, cpu_low=60.0, disk_queue_high=2.0, latency_factor=2.0):
+        self.limiter = limiter
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.load_source = load_source or SystemLoadSource()
+        self.estimate = estimate  # Returns the usual duration of an app in seconds, or None if it is not known
+        self.interval = interval  # Seconds between decisions
+        self.cpu_high = cpu_high  # CPU usage above which workers are removed
+        self.cpu_low = cpu_low  # CPU usage below which workers may be added
+        self.disk_queue_high = disk_queue_high  # Disk queue length above which workers are removed
+        self.latency_factor = latency_factor  # How much slower than their usual duration tasks may get
+        self.min_latency_samples = 3  # Finished tasks needed in an interval before latency is considered
+        self.latencies = []  # Durations of the tasks finished since the last decision, divided by their usual one
+        self.decisions = []  # (old limit, new limit, reason), kept for tuning
+
+    def record_latency(self, seconds, app=None):
+        """Records how long a finished task took, against how long its app usually takes if that is known."""
+        expected = self.estimate(app) if self.estimate and app is not None else None
+        if expected:
+            self.latencies.append(seconds / expected)
+
+    def step(self, sample: LoadSample) -> int:
+        """Makes one decision from a load sample and the recorded latencies, returning the new limit."""
+        old_limit = self.limiter.limit
+
+        # Each task is compared with its own usual duration, so an interval of large packages is not a slowdown
+        latency = statistics.median(self.latencies) if len(self.latencies) >= self.min_latency_samples else None
+        self.latencies = []
+
+        if sample.cpu_percent is not None and sample.cpu_percent > self.cpu_high:
+            new_limit, reason = old_limit // 2, "CPU overloaded"
+        elif sample.disk_queue is not None and sample.disk_queue > self.disk_queue_high:
+            new_limit, reason = old_limit // 2, "disk queue too long"
+        elif latency is not None and latency > self.latency_factor:
+            new_limit, reason = old_limit // 2, "tasks slowing down"
+        elif self.limiter.waiting and (sample.cpu_percent is None or sample.cpu_percent < self.cpu_low):
+            new_limit, reason = old_limit + 1, "headroom available"
+        else:
+            new_limit, reason = old_limit, "holding"
+
+        new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+        cpu = "n/a" if sample.cpu_percent is None else f"{sample.cpu_percent:.0f}%"
+        disk = "n/a" if sample.disk_queue is None else f"{sample.disk_queue:.1f}"
+        task_latency = "n/a" if latency is None else f"{latency:.1f}x usual"
+        logging.info(f"Concurrency {old_limit} -> {new_limit} ({reason}): cpu={cpu}, disk_queue={disk}, "
+                     f"latency={task_latency}, waiting={self.limiter.waiting}")
+        self.decisions.append((old_limit, new_limit, reason))
+        return new_limit
+
+    async def run(self):
+        """Keeps adjusting the limiter until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                sample = await asyncio.to_thread(self.load_source)
+            except Exception as e:
+                logging.warning(f"Could not sample the system load: {e}")
+                sample = LoadSample()
+            new_limit = self.step(sample)
+            if new_limit != self.limiter.limit:
+                await self.limiter.set_limit(new_limit)
+
+
+if __name__ == "__main__":
+    # Scripted load samples and task durations against the decisions they should lead to
+    import time
+
+    IDLE = LoadSample(cpu_percent=10, disk_queue=0.1)
+
+    def run_script(steps, limit=4, min_limit=1, max_limit=8) -> list[tuple[int, int, str]]:
+        """Runs the tasks of each step through the limiter, then decides on the step's load sample."""
+        # Each step is a load sample and the (usual, actual) durations in milliseconds of the tasks finished in it
+        samples = iter(sample for sample, _ in steps)
+        usual = {}
+
+        async def task(app, actual):
+            async with limiter:
+                assert limiter.active <= limiter.limit, f"{limiter.active} tasks running with a limit of {limiter.limit}"
+                started = time.perf_counter()
+                await asyncio.sleep(actual / 1000)
+                controller.record_latency(time.perf_counter() - started, app)
+
+        async def block(decided):
+            async with limiter:
+                await decided.wait()
+
+        async def run():
+            nonlocal limiter, controller
+            limiter = AdjustableLimiter(limit)
+            controller = AdaptiveConcurrencyController(limiter, min_limit, max_limit, load_source=lambda: next(samples),
+                                                       estimate=usual.get, interval=0)
+            for number, (_, durations) in enumerate(steps):
+                apps = [f"app{number}-{i}" for i in range(len(durations))]
+                usual.update((app, expected / 1000) for app, (expected, _) in zip(apps, durations))
+                tasks = [asyncio.create_task(task(app, actual)) for app, (_, actual) in zip(apps, durations)]
+                await asyncio.sleep(0)  # The timed tasks take their slots first
+                # One task more than the limit, so one is waiting when the decision is taken
+                decided = asyncio.Event()
+                blockers = [asyncio.create_task(block(decided)) for _ in range(limiter.limit + 1)]
+                await asyncio.gather(*tasks)
+                await asyncio.sleep(0)
+                await limiter.set_limit(controller.step(await asyncio.to_thread(controller.load_source)))
+                decided.set()
+                await asyncio.gather(*blockers)
+            return controller.decisions
+
+        limiter = controller = None
+        return asyncio.run(run())
+
+    def same_speed(*durations):
+        return [(duration, duration) for duration in durations]
+
+    checks = {
+        # Intervals of small and large installers on an idle machine are not a slowdown
+        "mixed package sizes": (run_script([(IDLE, same_speed(10, 11, 12)), (IDLE, same_speed(30, 35, 40)),
+                                            (IDLE, same_speed(10, 12, 9)), (IDLE, same_speed(60, 70, 80))]),
+                                [(4, 5, "headroom available"), (5, 6, "headroom available"),
+                                 (6, 7, "headroom available"), (7, 8, "headroom available")]),
+        "tasks slowing down": (run_script([(IDLE, same_speed(20, 20, 20)), (IDLE, [(20, 60), (30, 90), (10, 30)])]),
+                               [(4, 5, "headroom available"), (5, 2, "tasks slowing down")]),
+        "CPU and disk load": (run_script([(LoadSample(95, 0.1), []), (LoadSample(70, 3.0), []),
+                                          (LoadSample(70, 0.1), []), (LoadSample(95, 0.1), [])]),
+                              [(4, 2, "CPU overloaded"), (2, 1, "disk queue too long"), (1, 1, "holding"),
+                               (1, 1, "CPU overloaded")]),
+        "load not measured": (run_script([(LoadSample(), []), (LoadSample(), [])], limit=7),
+                              [(7, 8, "headroom available"), (8, 8, "headroom available")]),
+        "too few finished tasks": (run_script([(IDLE, [(10, 50), (10, 50)])]), [(4, 5, "headroom available")]),
+    }
+    failures = 0
+    for name, (decisions, expected) in checks.items():
+        if decisions != expected:
+            failures += 1
+        print(f"{'ok' if decisions == expected else 'FAIL'}: {name}, {decisions}")
+    print(f"{len(checks) - failures} of {len(checks)} passed")
+    sys.exit(1 if failures else 0)
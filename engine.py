@@ -0,0 +1,806 @@
+import json
+import logging
+import os
+import subprocess
+import asyncio
+import itertools
+import re
+import time
+import history
+import retry
+import settings
+import scheduling
+import tracing
+from concurrency import AdaptiveConcurrencyController, AdjustableLimiter
+from process_runner import CANCELLED, STALLED, TIMED_OUT, run_process
+from winget_progress import WingetProgressParser
+
+SELECTORS_FILE = os.path.join(settings.APP_DATA_DIR, "selectors.json")
+SELECTORS = ("--id", "--name")  # Cheapest and most reliable first
+
+# Outcomes of a single winget upgrade call
+UPDATED = "updated"
+UP_TO_DATE = "up_to_date"
+NOT_FOUND = "not_found"  # The selector did not match the package, so the next one may
+FAILED = "failed"
+ERROR = "error"  # The update crashed before winget could report anything
+TRANSIENT = "transient"  # Failed for a reason that may pass, like another installer running, so it is retried
+# TIMED_OUT, STALLED and CANCELLED come from process_runner, for winget calls that had to be killed
+
+# Messages reported for every outcome
+STATUS_MESSAGES = {
+    UPDATED: "Successfully updated",
+    UP_TO_DATE: "No available update",
+    NOT_FOUND: "No available update",
+    FAILED: "Could not be updated",
+    TRANSIENT: "Could not be updated",
+    ERROR: "Could not be updated",
+    TIMED_OUT: "Could not be updated (timed out)",
+    STALLED: "Could not be updated (stopped responding)",
+    CANCELLED: "Update stopped",
+}
+
+# Update modes
+PER_APP = "per_app"  # One winget call per app
+BATCH = "batch"  # One winget call per group of apps
+BATCH_SIZE = 10  # Apps upgraded by a single winget call in batch mode
+QUEUE_SIZE = 100  # Jobs queued ahead of the workers, a generator of apps is only read this far ahead
+
+# Markers in the streamed output of a multi-package winget upgrade
+FOUND_PACKAGE = re.compile(r"Found .*\[(?P<id>[^\]\s]+)\]")
+INSTALL_SUCCEEDED = ("Successfully installed",)
+INSTALL_FAILED = ("Installer failed", "Installation failed", "Installation abandoned")
+
+
+class SelectorCache:
+    """Remembers which winget selector found each package, so later runs try it first."""
+
+    def __init__(self, path=SELECTORS_FILE):
+        self.path = path
+        self.changed = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.selectors = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.selectors = {}
+
+    def get_order(self, app) -> list[str]:
+        """Returns the selectors to try for an app, the one that worked last time first."""
+        preferred = self.selectors.get(app.id)
+        if preferred not in SELECTORS:
+            return list(SELECTORS)
+        return [preferred] + [selector for selector in SELECTORS if selector != preferred]
+
+    def remember(self, app, selector):
+        """Records the selector that gave a definitive result for an app."""
+        if app.id and self.selectors.get(app.id) != selector:
+            self.selectors[app.id] = selector
+            self.changed = True
+
+    def save(self):
+        """Saves the selectors to AppData if any of them changed."""
+        if self.changed:
+            settings.write_json_atomic(self.path, self.selectors)
+            self.changed = False
+
+
+class Event:
+    """Callbacks called with the same arguments whenever the engine emits the event, like a Qt signal without Qt."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        """Calls a function on every emit."""
+        self.callbacks.append(callback)
+
+    def emit(self, *args):
+        """Calls every connected function with the arguments."""
+        for callback in self.callbacks:
+            callback(*args)
+
+
+# Events of the update engine, in the order of their arguments
+EVENTS = (
+    "update_progress",  # Overall percentage and a status message
+    "update_app_being_processed",  # App name
+    "app_progress",  # App name and how far along its download and install are
+    "overall_progress",  # Progress of the whole run, counting the apps still being updated
+    "eta_changed",  # Predicted seconds until the run is done
+    "queue_depth",  # Apps waiting for a worker
+    "completed",
+)
+
+
+class UpdateEngine:
+    """Updates apps with winget and reports its progress through event callbacks, without Qt."""
+
+    def __init__(self, concurrent_limit, update_mode=PER_APP, adaptive=False, schedule=scheduling.LIST_ORDER,
+                 timeout=1800, stall_timeout=600):
+        for name in EVENTS:
+            setattr(self, name, Event())
+        self.update_mode = update_mode
+        self.schedule = schedule
+        self.timeout = timeout  # Seconds a single app may take before its winget call is killed
+        self.stall_timeout = stall_timeout  # Seconds winget may print nothing new before it is killed
+        self.active = True
+        self.concurrent_limit = concurrent_limit  # In adaptive mode, the upper bound of the limit
+        self.adaptive = adaptive
+
+        # The lock and limiters belong to the loop that runs the updates, so they are created in it
+        self.lock = None  # Add a lock for shared variables
+        self.semaphore = None  # Limit number of concurrent updates
+        self.controller = None
+        self.queue = None  # Jobs waiting for a worker, each a coroutine function and its arguments
+        self.ready = None  # Set once the apps of a run can be queued
+        self.producers = set()  # Tasks putting apps on the queue
+        self.retry_timers = set()  # Tasks putting apps back on the queue once their retry is due
+        self.running = False  # Whether apps can be queued
+        self.completed_count = 0  # Initialize count of completed updates
+        self.total_apps = 0  # Total number of apps to update
+        self.partial_progress = {}  # Percentage of every app being updated, keyed by id or name
+        self.stop_requested = False  # Track whether stopping updates was requested
+        self.stop_event = None  # Set on stop, kills the running winget calls. Created in the update loop
+        self.loop = None
+        self.selectors = SelectorCache()
+        self.retries = retry.RetryPolicy()
+        self.history = history.get_store()
+        self.durations = scheduling.DurationHistory()
+        self.run_id = None
+        self.eta = None
+        self.last_eta_report = 0.0
+        self.attempts = {}  # Details of the running attempt of every app for the history, keyed by id or name
+        self.outcomes = {}  # Final outcome of every app of the run, keyed by id or name
+
+    async def check_and_install(self, app_list):
+        """Main update process: the apps go through a bounded queue, taken off it by a fixed number of workers."""
+        workers = []
+        try:
+            self.loop = asyncio.get_running_loop()
+            self.create_limits()
+            self.stop_event = asyncio.Event()
+            if self.stop_requested:
+                self.stop_event.set()
+            # Apps from a generator are counted as they are queued
+            self.total_apps = len(app_list) if hasattr(app_list, "__len__") else 0
+            self.completed_count = 0  # Reset completed count
+            self.partial_progress = {}
+            self.outcomes = {}
+            self.retries = retry.RetryPolicy()
+            self.running = True
+            logging.info(f"Total apps to update: {self.total_apps or 'unknown'}")
+            self.run_id = self.history.start_run(self.update_mode, self.semaphore.limit, self.total_apps)
+
+            # Apps are queued in list order, so reorder the list by the recorded durations
+            # Sorting by duration reads a generator of apps to the end, only the list order keeps it lazy
+            self.durations = await asyncio.to_thread(scheduling.DurationHistory.load, self.history)
+            app_list = scheduling.order_apps(app_list, self.durations, self.schedule)
+            self.eta = scheduling.EtaEstimator(self.durations, app_list if self.total_apps else [])
+            self.report_eta(force=True)
+
+            # Every attempt takes a slot of the limit on its own, the workers only bound how many apps are in flight
+            workers = [asyncio.create_task(self.work()) for _ in range(self.concurrent_limit)]
+            self.enqueue(app_list, counted=bool(self.total_apps))
+            self.ready.set()
+            controller_task = asyncio.create_task(self.controller.run()) if self.controller else None
+            try:
+                await self.wait_until_drained()
+            finally:
+                self.running = False
+                if controller_task:
+                    controller_task.cancel()
+
+            # Ensure completion signal is emitted when all tasks are done
+            if self.stop_requested:
+                logging.info("Update process stopped by user.")
+                self.update_progress.emit(self.get_overall_progress(),
+                                          "<font color='orange'>Update process was stopped.</font>")
+                self.completed.emit()
+            elif self.completed_count >= self.total_apps:
+                self.update_progress.emit(100, "<b>All updates completed!</b>")
+                self.completed.emit()
+            else:
+                logging.warning(f"Completed {self.completed_count} out of {self.total_apps} updates.")
+                self.update_progress.emit(self.get_overall_progress(), "Update process was stopped or finished with possible errors.")
+                self.completed.emit()
+
+        except Exception as e:
+            logging.error(f"System error during update: {e}", exc_info=True)
+            self.update_progress.emit(-1, f"System Error: {str(e)}")
+            self.completed.emit()
+
+        finally:
+            self.running = False
+            for worker in workers:
+                worker.cancel()
+            self.selectors.save()
+            if self.run_id:
+                self.history.end_run(self.run_id, self.completed_count, self.stop_requested, self.total_apps)
+
+    def enqueue(self, apps, counted=False):
+        """Queues more apps while the updates run, alongside the ones still being queued. Must be called on the loop."""
+        if not self.running:
+            logging.warning("Apps can only be queued while the updates run.")
+            return None
+        producer = asyncio.create_task(self.produce(apps, counted))
+        self.producers.add(producer)
+        producer.add_done_callback(self.producers.discard)
+        return producer
+
+    def add_apps(self, apps):
+        """Queues more apps while the updates run. Safe to call from any thread."""
+        if not self.running:
+            logging.warning("Apps can only be queued while the updates run.")
+            return
+        self.loop.call_soon_threadsafe(self.enqueue, list(apps))
+
+    async def produce(self, apps, counted):
+        """Puts apps on the queue as the workers make room for them, so a generator is only read that far ahead."""
+        await self.ready.wait()  # Apps added while the run starts are queued once the estimator exists
+        apps = iter(apps)
+        while not self.stop_requested:
+            # In batch mode every group of apps is a single job
+            group = list(itertools.islice(apps, BATCH_SIZE if self.update_mode == BATCH else 1))
+            if not group:
+                break
+            if not counted:
+                self.total_apps += len(group)
+                self.eta.add(group)
+            if self.update_mode == BATCH:
+                await self.queue.put((self.process_batch, group))
+            else:
+                await self.queue.put((self.process_app_and_update_status, group[0]))
+            self.report_queue_depth()
+
+    async def work(self):
+        """Takes jobs off the queue one at a time until the run is over."""
+        while True:
+            func, *args = await self.queue.get()
+            self.report_queue_depth()
+            try:
+                await func(*args)
+            except Exception as e:
+                logging.error(f"Error processing {args}: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def wait_until_drained(self):
+        """Waits until every queued app is done, including the ones still being queued or waiting to be retried."""
+        while True:
+            await self.queue.join()
+            pending = self.producers | self.retry_timers
+            if not pending:
+                return
+            await asyncio.wait(pending)
+
+    def report_queue_depth(self):
+        """Reports how many jobs are waiting for a worker."""
+        self.queue_depth.emit(self.queue.qsize())
+
+    def create_limits(self):
+        """Creates the lock and concurrency limiters in the running loop."""
+        self.lock = asyncio.Lock()
+        self.semaphore = AdjustableLimiter(min(2, self.concurrent_limit) if self.adaptive else self.concurrent_limit)
+        self.controller = (AdaptiveConcurrencyController(self.semaphore, 1, self.concurrent_limit,
+                                                         estimate=lambda app: self.durations.estimate(app))
+                           if self.adaptive else None)
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.ready = asyncio.Event()
+        self.producers = set()
+        self.retry_timers = set()
+
+    def request_stop(self):
+        """Stops the update process, killing the winget calls that are running. Safe to call from the GUI thread."""
+        self.stop_requested = True
+        if self.loop and self.stop_event:
+            try:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                pass  # The update loop has already finished
+
+    async def run_winget(self, args, app=None, timeout=None, **kwargs):
+        """Runs a winget call, killing it on a timeout, when it stops printing, or when the updates are stopped."""
+        parser = WingetProgressParser()
+        if app is not None:
+            async def follow_progress(text):
+                percent = parser.feed(text)
+                if percent is not None:
+                    self.set_app_progress(app, percent)
+            kwargs["on_output"] = follow_progress
+
+        logging.debug(f"Running {subprocess.list2cmdline(args)}")
+        result = await run_process(args, timeout=timeout or self.timeout, stall_timeout=self.stall_timeout,
+                                   cancel_event=self.stop_event, **kwargs)
+        if app is not None:
+            self.note_attempt(app, exit_code=result.returncode)
+            if parser.total_bytes:
+                self.note_attempt(app, download_bytes=parser.total_bytes)
+        return result
+
+    async def run_with_semaphore(self, func, *args, app=None):
+        """Run a task with semaphore control. The app it updates, if a single one, is timed for the adaptive limit."""
+        queued = time.perf_counter()
+        async with self.semaphore:
+            start = time.perf_counter()
+            tracing.add_span("Waiting for an update slot", "wait", queued, start,
+                             app=getattr(app, "name", None), limit=self.semaphore.limit)
+            try:
+                return await func(*args)
+            finally:
+                if self.controller:
+                    self.controller.record_latency(time.perf_counter() - start, app)
+
+    async def process_app_and_update_status(self, app, outcome=None):
+        """Process an app and update the progress. A TRANSIENT outcome of an earlier attempt is retried first."""
+        if self.stop_requested:
+            return
+
+        try:
+            if outcome is None:
+                outcome = await self.run_with_semaphore(self.start_attempt, app, app.name, self.process_app, app,
+                                                        app=app)
+            if outcome == TRANSIENT and self.retry_later(app, self.process_app_and_update_status, app):
+                return
+            if outcome is not None:
+                await self.report_app_done(app, outcome)
+
+        except Exception as e:
+            logging.error(f"Error processing {app}: {e}", exc_info=True)
+
+    def retry_later(self, app, func, *args) -> bool:
+        """Queues a job again once the backoff of an app's transient failure is over. False if no retries are left."""
+        delay = self.retries.get_delay(app.id or app.name)
+        if delay is None:
+            return False
+        self.report_retry(app, delay)
+        timer = asyncio.create_task(self.requeue(delay, (func, *args)))
+        self.retry_timers.add(timer)
+        timer.add_done_callback(self.retry_timers.discard)
+        return True
+
+    async def requeue(self, delay, job):
+        """Puts a job back on the queue after a delay, holding neither a worker nor a slot while it waits."""
+        await self.wait_to_retry(delay)
+        await self.queue.put(job)
+        self.report_queue_depth()
+
+    async def start_attempt(self, app, label, func, *args):
+        """Starts an attempt at updating an app once it has a slot, unless the updates were stopped meanwhile."""
+        if self.stop_requested:
+            return None
+        self.update_app_being_processed.emit(label)
+        self.note_attempt(app)
+        return await func(*args)
+
+    async def wait_to_retry(self, delay):
+        """Waits before a retry, returning early when the updates are stopped."""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def set_app_progress(self, app, percent):
+        """Reports how far along an app is, along with the overall progress weighted by it."""
+        key = app.id or app.name
+        if percent <= self.partial_progress.get(key, 0):
+            return  # The download and install stages each start from zero
+        self.partial_progress[key] = percent
+        self.app_progress.emit(app.name, percent)
+        self.overall_progress.emit(self.get_overall_progress())
+        self.report_eta()
+
+    def report_eta(self, force=False):
+        """Emits the predicted time left, at most once a second unless forced."""
+        now = time.monotonic()
+        if self.eta is None or (not force and now - self.last_eta_report < 1.0):
+            return
+        self.last_eta_report = now
+        self.eta_changed.emit(self.eta.remaining(self.semaphore.limit))
+
+    def get_overall_progress(self) -> int:
+        """The finished apps plus the finished share of every app being updated, as a percentage of all apps."""
+        if self.total_apps <= 0:
+            return 100
+        done = self.completed_count + sum(self.partial_progress.values()) / 100
+        return min(100, int(done / self.total_apps * 100))
+
+    def note_attempt(self, app, **details):
+        """Adds details, like the selector or exit code, to the history entry of an app's running attempt."""
+        key = app.id or app.name
+        if key not in self.attempts:
+            self.attempts[key] = {"started": time.time()}
+            if self.eta:
+                self.eta.app_started(app)
+                self.report_eta(force=True)
+        self.attempts[key].update(details)
+
+    def finish_attempt(self, app, outcome) -> tuple[float, str | None]:
+        """Records an app's running attempt in the history. Returns how long it took and why it failed, if known."""
+        key = app.id or app.name
+        self.partial_progress.pop(key, None)
+
+        ended = time.time()
+        attempt = self.attempts.pop(key, {})
+        started = attempt.pop("started", ended)
+        reason = attempt.pop("reason", None)
+        self.history.record_attempt(self.run_id, key, app.name, started, ended, outcome,
+                                    version_before=app.version,
+                                    version_after=app.available if outcome == UPDATED else app.version,
+                                    **attempt)
+        return ended - started, reason
+
+    def report_retry(self, app, delay):
+        """Records an app's transient failure and reports when it is retried."""
+        _, reason = self.finish_attempt(app, TRANSIENT)
+        logging.info(f"Retrying {app.name} in {delay:.0f}s: {reason}")
+        self.update_progress.emit(self.get_overall_progress(),
+                                  f"Retrying in {delay:.0f}s ({reason or 'failed'}): {app.name}")
+
+    async def report_app_done(self, app, outcome, update_status=None):
+        """Counts an app as completed, records the attempt in the history and updates the progress."""
+        async with self.lock:  # Lock for shared variable updates
+            self.completed_count += 1
+            self.outcomes[app.id or app.name] = outcome
+            seconds, _ = self.finish_attempt(app, outcome)
+            if outcome != CANCELLED:
+                self.durations.record(app, seconds)
+                if self.eta:
+                    self.eta.app_finished(app, seconds)
+
+            self.update_progress.emit(self.get_overall_progress(),
+                                      f"{update_status or STATUS_MESSAGES[outcome]}: {app.name}")
+            self.report_eta(force=True)
+
+    async def process_batch(self, apps):
+        """Upgrades a group of apps with one winget call, reporting each app as winget's output reaches it."""
+        if self.stop_requested:
+            return
+
+        pending = {app.id: app for app in apps if app.id}
+        current = None  # The app winget is working on
+        current_parser = None
+        failed = []  # Apps whose installer failed for a reason that may pass
+        buffer = ""
+
+        async def read_output(text):
+            nonlocal buffer, current, current_parser
+            buffer += text
+            # Progress bars redraw themselves with carriage returns, so every redraw is parsed on its own
+            *segments, buffer = re.split(r"[\r\n]", buffer)
+            for segment in segments:
+                line = segment.strip()
+
+                found = FOUND_PACKAGE.search(line)
+                if found and found.group("id") in pending:
+                    current = pending.pop(found.group("id"))
+                    current_parser = WingetProgressParser()
+                    self.note_attempt(current, selector="--id")
+                    self.update_app_being_processed.emit(current.name)
+                elif current and line.startswith(INSTALL_SUCCEEDED):
+                    logging.info(f"Successfully updated {current.name}")
+                    self.selectors.remember(current, "--id")
+                    self.note_attempt(current, download_bytes=current_parser.total_bytes or None)
+                    await self.report_app_done(current, UPDATED)
+                    current = None
+                elif current and line.startswith(INSTALL_FAILED):
+                    logging.warning(f"Update for {current.name} failed: {line}")
+                    self.note_attempt(current, download_bytes=current_parser.total_bytes or None)
+                    if self.classify_failure(current, None, line) == TRANSIENT:
+                        self.partial_progress.pop(current.id or current.name, None)  # Not done, the bar holds still
+                        failed.append(current)
+                    else:
+                        await self.report_app_done(current, FAILED, "Could not be updated")
+                    current = None
+                elif current:
+                    percent = current_parser.feed(f"{line}\n")
+                    if percent is not None:
+                        self.set_app_progress(current, percent)
+
+        async def upgrade():
+            if self.stop_requested:
+                return None
+            args = ["winget", "upgrade", *pending, "--exact", "--silent", "--accept-source-agreements"]
+            logging.info(f"Updating {len(pending)} apps in one winget call.")
+            return await self.run_winget(args, timeout=self.timeout * max(1, len(pending)), merge_stderr=True,
+                                         on_output=read_output)
+
+        try:
+            result = await self.run_with_semaphore(upgrade)
+            if result is None:
+                return
+            if buffer:
+                await read_output("\n")
+
+            if result.ended_by in (TIMED_OUT, STALLED) and current:
+                # Retrying the app winget got stuck on would most likely hang again
+                await self.report_app_done(current, result.ended_by)
+                current = None
+
+        except Exception as e:
+            logging.error(f"Error processing batch: {e}", exc_info=True)
+
+        # An app winget started on without a clear result, or never mentioned, is retried on its own
+        leftovers = ([current] if current else []) + list(pending.values()) + [app for app in apps if not app.id]
+        await asyncio.gather(*(self.process_app_and_update_status(app, TRANSIENT) for app in failed),
+                             *(self.process_app_and_update_status(app) for app in leftovers))
+
+    async def process_app(self, app):
+        """Handle each app update, returning its outcome."""
+        try:
+            logging.info(f"Updating {app.name} using winget.")
+            return await self.winget_update(app)
+
+        except Exception as e:
+            logging.error(f"Error processing {app}: {e}", exc_info=True)
+            return ERROR
+
+    async def winget_update(self, app):
+        """Use winget to update apps, returning the outcome of the first selector that gives a definitive result."""
+        for option in self.selectors.get_order(app):
+            if self.stop_requested:
+                logging.info(f"Update stopped during app {app.name}")
+                return CANCELLED
+
+            outcome = await self.run_winget_update_option(app, option)
+            if outcome == NOT_FOUND:
+                continue
+
+            if outcome != CANCELLED:
+                self.selectors.remember(app, option)
+            return outcome
+
+        return NOT_FOUND
+
+    async def run_winget_update_option(self, app, option):
+        """Runs the winget update command and parses it's output."""
+        try:
+            name_or_id = app.name if option == "--name" else app.id
+            if not name_or_id:
+                logging.debug(f"Skipping {option}: no identifier for {app.name}")
+                return NOT_FOUND
+
+            # Ids are matched exactly, so they never hit a different package
+            args = ["winget", "upgrade", option, name_or_id, "--silent"]
+            if option == "--id":
+                args.append("--exact")
+
+            self.note_attempt(app, selector=option)
+            result = await self.run_winget(args, app=app)
+            if result.ended_by:
+                return result.ended_by
+
+            outcome = self.get_upgrade_outcome(app, result.returncode, result.stdout, result.stderr)
+            if outcome == NOT_FOUND:
+                logging.info(f"No installed package matches {option} {name_or_id}.")
+            elif outcome == FAILED:
+                outcome = self.classify_failure(app, result.returncode, result.stdout + result.stderr)
+            return outcome
+
+        except Exception as e:
+            logging.warning(f"Failed using {option} for {app.name}: {e}")
+            return NOT_FOUND
+
+    @staticmethod
+    def get_upgrade_outcome(app, returncode, result_stdout, result_stderr):
+        """Classifies the output of a single winget upgrade call."""
+        if "No installed package" in result_stdout:
+            return NOT_FOUND
+
+        if "No available upgrade" in result_stdout or "No applicable upgrade" in result_stdout:
+            logging.info(f"{app.name} is already up to date.")
+            return UP_TO_DATE
+
+        if "Success" in result_stdout or returncode == 0:
+            logging.info(f"Successfully updated {app.name}")
+            return UPDATED
+
+        logging.warning(f"Update for {app.name} failed: {result_stderr}")
+        return FAILED
+
+    def classify_failure(self, app, returncode, output):
+        """Returns TRANSIENT for a failed winget call that may succeed when retried, otherwise FAILED."""
+        reason = retry.classify_failure(returncode, output)
+        if reason is None:
+            return FAILED
+        self.note_attempt(app, reason=reason)
+        return TRANSIENT
+
+    def run_update_command(self, command):
+        """Execute a shell command to run updates. This does not need to be async."""
+        try:
+            with tracing.span("shell", "process", command=command) as span:
+                result = subprocess.run(
+                    command,
+                    shell=True,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    timeout=60
+                )
+                span.set(exit_code=result.returncode, output_chars=len(result.stdout) + len(result.stderr))
+
+            # Check if the upgrade was successful based on stdout content
+            if "No installed package" in result.stdout or "No available upgrade" in result.stdout:
+                return False
+
+            if "Success" in result.stdout:
+                logging.info(f"Update command succeeded: {command}")
+                return True
+
+            return False
+
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            logging.warning(f"Command timed out or failed: {command}")
+            return False
+
+
+if __name__ == "__main__":
+    # Scaling benchmark: 10 to 50k fake packages that are up to date at once, fed from a generator
+    # Memory still grows with the run, as the outcome, duration and estimate of every app are kept until it ends
+    import sys
+    import tempfile
+    import tracemalloc
+    from inventory import AppRecord
+
+    class FakeEngine(UpdateEngine):
+        async def winget_update(self, app):
+            await asyncio.sleep(0)
+            return UP_TO_DATE
+
+    def fake_apps(count):
+        return (AppRecord(f"App {i}", f"Fake.App{i}", "1.0", "1.1") for i in range(count))
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        for count in (10, 100, 1_000, 10_000, 50_000):
+            engine = FakeEngine(4)
+            engine.history = history.HistoryStore(os.path.join(directory, f"{count}.sqlite3"))
+            depths = []
+            engine.queue_depth.connect(depths.append)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            asyncio.run(engine.check_and_install(fake_apps(count)))
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            engine.history.close()
+
+            print(f"{count:6d} apps: {seconds:6.2f}s ({count / seconds:5.0f}/s), peak {peak / 1024 ** 2:5.1f}MB "
+                  f"({peak / count / 1024:5.2f}KB per app), deepest queue {max(depths):3d}, "
+                  f"done {engine.completed_count:6d}")
+
+    # A fake winget put first on PATH, which acts on package ids: Renamed ones are only found by name, Hang ones
+    # hang with a child process, Spin ones show a spinner forever and Chatty ones print forever. A script with a
+    # shebang, so the runs below need Linux or macOS
+    FAKE_WINGET = """
+import os, subprocess, sys, time
+args = sys.argv[1:]
+with open(os.environ["FAKE_WINGET_CALLS"], "a") as f:
+    f.write(" ".join(args) + "\\n")
+time.sleep(0.1)  # Starting winget and reading its sources
+if "--id" in args or "--name" in args:
+    option = "--id" if "--id" in args else "--name"
+    targets = [args[args.index(option) + 1]]
+    if option == "--id" and "Renamed" in targets[0]:
+        print("No installed package found matching input criteria.")
+        sys.exit(1)
+else:
+    targets = [arg for arg in args[1:] if not arg.startswith("--")]  # A batch of ids
+for target in targets:
+    print(f"Found {target} [{target}] Version 1.1", flush=True)
+    if "Hang" in target:
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(300)"])
+        with open(os.path.join(os.environ["FAKE_WINGET_PIDS"], str(child.pid)), "w"):
+            pass
+        time.sleep(300)
+    while "Spin" in target:
+        for char in "-\\\\|/":
+            print(f"\\r{char}", end="", flush=True)
+            time.sleep(0.1)
+    while "Chatty" in target:
+        print("Still installing...", flush=True)
+        time.sleep(0.2)
+    time.sleep(0.05)
+    print("Successfully installed", flush=True)
+"""
+
+    def make_engine(engine_class, directory, name, *args, **kwargs):
+        """An engine that keeps its history and selectors in the temporary directory."""
+        engine = engine_class(*args, **kwargs)
+        engine.history = history.HistoryStore(os.path.join(directory, f"{name}.sqlite3"))
+        engine.selectors = SelectorCache(os.path.join(directory, f"{name}-selectors.json"))
+        return engine
+
+    def run_fake_winget(engine, apps, stop_after=None) -> tuple[float, list[str]]:
+        """Updates the apps against the fake winget, returning the wall time and the winget calls made."""
+        async def run():
+            if stop_after is not None:
+                asyncio.get_running_loop().call_later(stop_after, engine.request_stop)
+            await engine.check_and_install(apps)
+
+        open(os.environ["FAKE_WINGET_CALLS"], "w").close()
+        started = time.perf_counter()
+        asyncio.run(run())
+        seconds = time.perf_counter() - started
+        engine.history.close()
+        with open(os.environ["FAKE_WINGET_CALLS"]) as f:
+            return seconds, f.read().splitlines()
+
+    class BothSelectorsEngine(UpdateEngine):
+        """The selector handling replaced in 1.x, which ran winget with the id and then with the name for every app."""
+
+        async def winget_update(self, app):
+            outcomes = [await self.run_winget_update_option(app, option) for option in SELECTORS]
+            return next((outcome for outcome in outcomes if outcome != NOT_FOUND), NOT_FOUND)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "winget"), "w") as f:
+            f.write(f"#!{sys.executable}\n{FAKE_WINGET}")
+        os.chmod(os.path.join(directory, "winget"), 0o755)
+        os.makedirs(os.path.join(directory, "pids"))
+        os.environ["PATH"] = directory + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_WINGET_CALLS"] = os.path.join(directory, "calls.txt")
+        os.environ["FAKE_WINGET_PIDS"] = os.path.join(directory, "pids")
+
+        # Wall time of a 50 app run, a fifth of them only found by name, with both selectors and the first that works
+        apps = [AppRecord(f"App {i}", f"Fake.{'Renamed' if i % 5 == 0 else 'App'}{i}", "1.0", "1.1")
+                for i in range(50)]
+        # The old handling installs every app found by id a second time, by name
+        runs = [("id then name", BothSelectorsEngine, "both", 100, 90),
+                ("first that works", UpdateEngine, "first", 60, 50),
+                ("remembered selectors", UpdateEngine, "first", 50, 50)]
+        for label, engine_class, name, expected_calls, expected_installs in runs:
+            engine = make_engine(engine_class, directory, name, 4)
+            seconds, calls = run_fake_winget(engine, apps)
+            installs = sum(not ("--id" in call and "Renamed" in call) for call in calls)
+            updated = sum(outcome == UPDATED for outcome in engine.outcomes.values())
+            print(f"50 apps, {label:20s}: {seconds:5.2f}s, {len(calls):3d} winget calls, {installs:3d} installs, "
+                  f"{updated} updated")
+            assert (len(calls), installs, updated) == (expected_calls, expected_installs, 50), label
+
+        def live_children() -> int:
+            """Children of hung fake installs that are still running."""
+            alive = 0
+            for pid in os.listdir(os.environ["FAKE_WINGET_PIDS"]):
+                os.remove(os.path.join(os.environ["FAKE_WINGET_PIDS"], pid))
+                # Killed orphans can stay zombies until init reaps them, so ps tells them apart from running ones
+                state = subprocess.run(["ps", "-o", "stat=", "-p", pid], stdout=subprocess.PIPE, text=True).stdout
+                alive += bool(state.strip()) and not state.startswith("Z")
+            return alive
+
+        # Hung, spinning and endless installs are killed with their children, and the others still get their slot
+        apps = [AppRecord("Hang", "Fake.Hang"), AppRecord("Spin", "Fake.Spin"), AppRecord("Chatty", "Fake.Chatty"),
+                *(AppRecord(f"App {i}", f"Fake.App{i}") for i in range(3))]
+        engine = make_engine(UpdateEngine, directory, "timeouts", 2, timeout=4, stall_timeout=2)
+        seconds, _ = run_fake_winget(engine, apps)
+        children = live_children()
+        print(f"Timeouts: {seconds:.1f}s with a 2 slot limit, {engine.outcomes}, "
+              f"{children} children of hung installs left running")
+        assert engine.outcomes == {"Fake.Hang": STALLED, "Fake.Spin": STALLED, "Fake.Chatty": TIMED_OUT,
+                                   "Fake.App0": UPDATED, "Fake.App1": UPDATED, "Fake.App2": UPDATED}
+        assert children == 0
+
+        # Stopping kills the running calls right away instead of waiting for their timeout
+        apps = [AppRecord(f"Hang {i}", f"Fake.Hang{i}") for i in range(4)]
+        engine = make_engine(UpdateEngine, directory, "stop", 2)
+        seconds, calls = run_fake_winget(engine, apps, stop_after=1)
+        children = live_children()
+        print(f"Stop after 1s: returned after {seconds:.1f}s, {len(calls)} winget calls started, "
+              f"{engine.outcomes}, {children} children of hung installs left running")
+        assert seconds < 2, "stopping waited for the hung calls"
+        assert len(calls) == 2 and engine.outcomes == {"Fake.Hang0": CANCELLED, "Fake.Hang1": CANCELLED}
+        assert children == 0
+
+        # In batch mode the app winget hangs on is reported, and the apps after it are updated on their own
+        apps = [AppRecord(f"App {i}", f"Fake.App{i}") for i in range(2)] + [AppRecord("Hang", "Fake.Hang")] + [
+            AppRecord(f"App {i}", f"Fake.App{i}") for i in range(2, 4)]
+        engine = make_engine(UpdateEngine, directory, "batch", 2, update_mode=BATCH, stall_timeout=2)
+        seconds, calls = run_fake_winget(engine, apps)
+        children = live_children()
+        print(f"Batch with a hang: {seconds:.1f}s, {len(calls)} winget calls, {engine.outcomes}, "
+              f"{children} children of hung installs left running")
+        assert engine.outcomes == {"Fake.App0": UPDATED, "Fake.App1": UPDATED, "Fake.Hang": STALLED,
+                                   "Fake.App2": UPDATED, "Fake.App3": UPDATED}
+        assert children == 0
@@ -0,0 +1,159 @@
+import threading
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+FRAME_RATE = 30  # Times per second the buffered events are shown while updates run
+
+
+def format_status(message) -> str:
+    """Colors an update status message for the status box."""
+    if "Successfully updated" in message:
+        return f"<font color='green'>{message}</font>"
+    elif "No available update" in message:
+        # Extract the app name from the message (assuming it's in the format "No available update: <app_name>")
+        app_name = message.split(":")[-1].strip() if ":" in message else "Unknown App"
+        # return f"<font color='yellow'>{message}</font>"  <-- Original code, updates always succeed though
+        return f"<font color='green'>Successfully updated: {app_name}</font>"
+    elif "Could not be updated" in message:
+        return f"<font color='red'>{message}</font>"
+    return message
+
+
+class EventAggregator(QObject):
+    """Buffers the update manager's events in its own thread and hands them to the GUI thread once a frame."""
+    status_lines = pyqtSignal(list)  # Every status box line of a frame, formatted as HTML
+    progress = pyqtSignal(int)
+    app_progress = pyqtSignal(str, int)
+    eta = pyqtSignal(float)
+
+    def __init__(self, parent=None, frame_rate=FRAME_RATE):
+        super().__init__(parent)
+        self.lock = threading.Lock()
+        self.lines = []
+        self.latest = {}  # Newest arguments of every progress signal by name, older ones of a frame are never shown
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(1000 / frame_rate))
+        self.timer.timeout.connect(self.flush)
+
+    def connect_manager(self, manager):
+        """Buffers the signals of an update manager. They run in its thread instead of being queued to the GUI."""
+        direct = Qt.ConnectionType.DirectConnection
+        manager.update_progress.connect(self.add_status, direct)
+        manager.update_app_being_processed.connect(self.add_processing, direct)
+        manager.app_progress.connect(self.add_app_progress, direct)
+        manager.overall_progress.connect(self.add_progress, direct)
+        manager.eta_changed.connect(self.add_eta, direct)
+
+    def start(self):
+        """Starts showing the buffered events."""
+        self.timer.start()
+
+    def stop(self):
+        """Shows the events still buffered and stops the timer."""
+        self.timer.stop()
+        self.flush()
+
+    def add_status(self, progress, message):
+        """Buffers a status message and the overall progress it was sent with."""
+        line = format_status(message)  # Formatted in the updater's thread, not the GUI's
+        with self.lock:
+            self.lines.append(line)
+            self.latest["progress"] = (progress,)
+
+    def add_processing(self, name):
+        """Buffers the name of an app the update manager started on."""
+        with self.lock:
+            self.lines.append(f"<b>Processing:</b> {name}")
+
+    def add_app_progress(self, name, percent):
+        """Keeps the newest progress of a single app."""
+        with self.lock:
+            self.latest["app_progress"] = (name, percent)
+
+    def add_progress(self, progress):
+        """Keeps the newest overall progress."""
+        with self.lock:
+            self.latest["progress"] = (progress,)
+
+    def add_eta(self, seconds):
+        """Keeps the newest predicted time left."""
+        with self.lock:
+            self.latest["eta"] = (seconds,)
+
+    def flush(self):
+        """Emits the newest progress and every status line buffered since the last frame, as one batch."""
+        with self.lock:
+            lines, self.lines = self.lines, []
+            latest, self.latest = self.latest, {}
+        for name, args in latest.items():
+            getattr(self, name).emit(*args)
+        if lines:
+            self.status_lines.emit(lines)
+
+
+if __name__ == "__main__":
+    # Stress test: a worker thread pushes 10k events, measured by how late they show and how long the GUI thread stalls
+    import re
+    import statistics
+    import sys
+    import time
+    from PyQt6.QtWidgets import QApplication, QTextEdit
+
+    EVENTS = 10_000
+
+    class Emitter(QObject):
+        update_progress = pyqtSignal(int, str)
+        update_app_being_processed = pyqtSignal(str)
+        app_progress = pyqtSignal(str, int)
+        overall_progress = pyqtSignal(int)
+        eta_changed = pyqtSignal(float)
+
+    def run(aggregated) -> tuple[list[float], list[float]]:
+        """Shows EVENTS status lines with or without the aggregator, returning their latencies and the GUI stalls."""
+        status_box = QTextEdit()
+        emitter = Emitter()
+        sent = [0.0] * EVENTS
+        latencies, stalls = [], []
+        last_tick = time.perf_counter()
+
+        def show(lines):
+            now = time.perf_counter()
+            status_box.append("<br>".join(lines))
+            latencies.extend(now - sent[int(i)] for i in re.findall(r"App (\d+)", "".join(lines)))
+            if len(latencies) >= EVENTS:
+                application.quit()
+
+        def tick():
+            nonlocal last_tick
+            now = time.perf_counter()
+            stalls.append(now - last_tick)
+            last_tick = now
+
+        if aggregated:
+            aggregator = EventAggregator()
+            aggregator.connect_manager(emitter)
+            aggregator.status_lines.connect(show)
+            aggregator.start()
+        else:
+            emitter.update_progress.connect(lambda progress, message: show([format_status(message)]))
+
+        def push():
+            for i in range(EVENTS):
+                sent[i] = time.perf_counter()
+                emitter.overall_progress.emit(i * 100 // EVENTS)
+                emitter.update_progress.emit(i * 100 // EVENTS, f"Successfully updated: App {i}")
+
+        heartbeat = QTimer()
+        heartbeat.setInterval(1)
+        heartbeat.timeout.connect(tick)
+        heartbeat.start()
+        threading.Thread(target=push, daemon=True).start()
+        application.exec()
+        heartbeat.stop()
+        return latencies, stalls
+
+    application = QApplication(sys.argv)
+    for aggregated in (False, True):
+        latencies, stalls = run(aggregated)
+        print(f"{'Aggregated' if aggregated else 'Per event':>10}: "
+              f"latency mean {statistics.fmean(latencies) * 1000:7.1f}ms, max {max(latencies) * 1000:7.1f}ms, "
+              f"longest GUI stall {max(stalls) * 1000:7.1f}ms")
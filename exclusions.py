@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import threading
+import settings
+from inventory import AppRecord
+
+# Constants
+EXCLUSIONS_FILE = os.path.join(settings.APP_DATA_DIR, "exclusions.json")
+JOURNAL_FILE = os.path.join(settings.APP_DATA_DIR, "exclusions.journal")
+EXCLUSIONS_VERSION = 2  # Version 1 files were a bare list of app dicts
+
+
+def get_exclusion_key(app) -> str:
+    """Keys an app by its package id, falling back to its name for apps without one."""
+    return f"id:{app.id}" if app.id else f"name:{app.name}"
+
+
+class ExclusionIndex:
+    """The skipped apps, indexed by package id (or name) for constant time lookups."""
+
+    def __init__(self, apps=()):
+        self.apps_by_key = {}  # Keeps the order apps were excluded in
+        for app in apps:
+            self.add(app)
+
+    def __contains__(self, app) -> bool:
+        # Apps excluded without an id can only be matched by their name
+        return (get_exclusion_key(app) in self.apps_by_key or
+                f"name:{app.name}" in self.apps_by_key)
+
+    def __iter__(self):
+        return iter(self.apps_by_key.values())
+
+    def __len__(self) -> int:
+        return len(self.apps_by_key)
+
+    def add(self, app) -> bool:
+        """Excludes an app. Returns False if it was already excluded."""
+        if app in self:
+            return False
+        self.apps_by_key[get_exclusion_key(app)] = app
+        return True
+
+    def remove(self, app) -> bool:
+        """Restores an app. Returns False if it was not excluded."""
+        for key in (get_exclusion_key(app), f"name:{app.name}"):
+            if self.apps_by_key.pop(key, None) is not None:
+                return True
+        return False
+
+
+class ExclusionStore(ExclusionIndex):
+    """An exclusion index that appends every change to a journal, which is compacted into a snapshot in the background."""
+
+    def __init__(self, snapshot_file=EXCLUSIONS_FILE, journal_file=JOURNAL_FILE, debounce=0.5, compact_after=50):
+        super().__init__()
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.debounce = debounce  # Seconds to wait for more edits before writing them out in one go
+        self.compact_after = compact_after  # Journal entries after which the snapshot is rewritten
+        self.pending = []  # Journal lines not yet written
+        self.journal_entries = 0
+        self.flush_timer = None
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, **kwargs) -> "ExclusionStore":
+        """Loads the snapshot and replays the journal on top of it, migrating files from older versions."""
+        store = cls(**kwargs)
+        migrated = False  # Whether the files on disk need to be rewritten
+
+        try:
+            with open(store.snapshot_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except json.JSONDecodeError:
+            # Snapshots are replaced atomically, so keep a corrupt one around instead of silently dropping it
+            logging.error(f"Could not read {store.snapshot_file}, moving it aside")
+            os.replace(store.snapshot_file, f"{store.snapshot_file}.corrupt")
+            data = {}
+
+        if isinstance(data, list):
+            migrated = True
+            data = {"exclusions": data}
+        for app in data.get("exclusions", []):
+            if isinstance(app, dict):
+                ExclusionIndex.add(store, AppRecord.from_dict(app))
+
+        try:
+            with open(store.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        if not line.endswith("\n"):
+                            raise json.JSONDecodeError("Unterminated entry", line, len(line))
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Interrupted write, compact right away so new entries are not appended after it
+                        logging.warning("Ignoring an incomplete exclusions journal entry")
+                        migrated = True
+                        break
+                    if entry.get("op") == "add":
+                        ExclusionIndex.add(store, AppRecord.from_dict(entry["app"]))
+                    elif entry.get("op") == "remove":
+                        ExclusionIndex.remove(store, AppRecord.from_dict(entry["app"]))
+                    store.journal_entries += 1
+        except FileNotFoundError:
+            pass
+
+        if migrated:
+            logging.info(f"Rewriting {len(store)} exclusions as a version {EXCLUSIONS_VERSION} snapshot")
+            store.compact()
+        return store
+
+    def add(self, app) -> bool:
+        with self.lock:
+            if not super().add(app):
+                return False
+            self.record({"op": "add", "app": app.to_dict()})
+            return True
+
+    def remove(self, app) -> bool:
+        with self.lock:
+            if not super().remove(app):
+                return False
+            self.record({"op": "remove", "app": app.to_dict()})
+            return True
+
+    def record(self, entry):
+        """Queues a journal entry, coalescing rapid successive edits into a single write."""
+        self.pending.append(json.dumps(entry))
+        if self.flush_timer is None:
+            self.flush_timer = threading.Timer(self.debounce, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def flush(self, compact=True):
+        """Appends the queued entries to the journal, compacting it in the background once it grows too long."""
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if not self.pending:
+                return
+
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write("".join(f"{line}\n" for line in self.pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_entries += len(self.pending)
+            self.pending.clear()
+
+            if compact and self.journal_entries >= self.compact_after:
+                threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Writes a new snapshot with write-temp-then-rename, then empties the journal."""
+        with self.lock:
+            self.flush(compact=False)
+            settings.write_json_atomic(self.snapshot_file, {"version": EXCLUSIONS_VERSION, "exclusions": [app.to_dict() for app in self]})
+
+            # A crash before this point only means the journal is replayed again, which gives the same result
+            with open(self.journal_file, "w", encoding="utf-8"):
+                pass
+            self.journal_entries = 0
+
+    def close(self):
+        """Writes out any queued edits. Called when the app exits."""
+        self.flush(compact=False)
+
+
+def load_exclusions() -> ExclusionStore:
+    """Loads exclusions from the exclusions.json snapshot and journal in AppData."""
+    return ExclusionStore.load()
+
+
+if __name__ == "__main__":
+    # Fault injection: a writer process is killed at random points, then the files it left behind are reloaded
+    import random
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    def get_state(store) -> list[str]:
+        return sorted(get_exclusion_key(app) for app in store)
+
+    if sys.argv[1:2] == ["--writer"]:
+        # Skips and restores random apps one at a time, printing the state before and after each is written
+        directory = sys.argv[2]
+        store = ExclusionStore.load(snapshot_file=os.path.join(directory, "exclusions.json"),
+                                    journal_file=os.path.join(directory, "exclusions.journal"),
+                                    debounce=60, compact_after=5)
+        print(json.dumps({"written": get_state(store)}), flush=True)
+        rng = random.Random()
+        while True:
+            number = rng.randrange(20)
+            app = AppRecord(f"App {number}", f"Vendor.App{number}")
+            with store.lock:  # Holds off the compaction thread until the state is printed
+                if not store.remove(app):
+                    store.add(app)
+                print(json.dumps({"writing": get_state(store)}), flush=True)
+            store.flush()  # Compacts in a background thread every 5 entries
+            print(json.dumps({"written": get_state(store)}), flush=True)
+
+    logging.basicConfig(level=logging.ERROR)
+    RUNS = 200
+    rng = random.Random(9)
+    failures = torn = writes = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for run in range(RUNS):
+            writer = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--writer", directory],
+                                      stdout=subprocess.PIPE, text=True)
+            output = writer.stdout.readline()  # Loaded, so the kill lands among the writes
+            time.sleep(rng.random() * 0.05)
+            writer.kill()
+            output += writer.communicate()[0]
+            states = [json.loads(line) for line in output.splitlines() if line.strip()]
+            written = [state["written"] for state in states if "written" in state]
+            writing = [state["writing"] for state in states if "writing" in state]
+            writes += len(written) - 1
+
+            # Half of the time, tear the last journal entry as if the disk lost the end of the write
+            journal = os.path.join(directory, "exclusions.journal")
+            allowed = written[-1:] + writing[-1:]
+            if rng.random() < 0.5 and os.path.exists(journal) and os.path.getsize(journal):
+                with open(journal, "rb") as f:
+                    last_line = f.read().rstrip(b"\n").rsplit(b"\n", 1)[-1]
+                with open(journal, "rb+") as f:
+                    f.truncate(os.path.getsize(journal) - rng.randint(1, len(last_line) + 1))
+                allowed += written[-2:-1]
+                torn += 1
+
+            try:
+                loaded = get_state(ExclusionStore.load(snapshot_file=os.path.join(directory, "exclusions.json"),
+                                                       journal_file=journal))
+            except Exception as e:
+                loaded = repr(e)
+            if loaded not in allowed:
+                failures += 1
+                print(f"Run {run}: loaded {loaded}, expected one of {allowed}")
+
+    print(f"{RUNS} writers killed after {writes / RUNS:.0f} writes on average ({torn} with a torn journal entry), "
+          f"{failures} reloads lost or invented edits")
+    sys.exit(1 if failures else 0)
@@ -1,12 +1,27 @@
 import asyncio
+import concurrent.futures
+import logging
 import sys
+import time
 from PyQt6.QtWidgets import (QApplication, QListWidget, QPushButton, QVBoxLayout, QWidget, QProgressBar, QTextEdit,
                              QHBoxLayout, QStackedWidget, QGroupBox, QLabel, QListWidgetItem, QSizePolicy, QComboBox,
-                             QMessageBox, QDialog)
-from PyQt6.QtCore import Qt, QRunnable, pyqtSignal, QObject, pyqtSlot, QThreadPool
+                             QMessageBox, QDialog, QCheckBox)
+from PyQt6.QtCore import Qt, pyqtSignal, QObject
 from PyQt6.QtGui import QIcon, QFont, QColor
+import exclusions
 import gui_functions
-from updater import UpdateManager
+import history
+import inventory
+import loop_thread
+import powershell_host
+import scheduling
+import settings
+import tracing
+from event_aggregator import EventAggregator
+from updater import UpdateManager, PER_APP, BATCH
+
+STARTUP_TIME = time.perf_counter()  # Reference point for the startup time measurements
+INVENTORY_CHUNK_SIZE = 100  # How many apps are added to the lists at once while the inventory loads
 
 
 class AsyncSignals(QObject):
@@ -14,19 +29,21 @@ class AsyncSignals(QObject):
     error = pyqtSignal(str)
 
 
-class AsyncWorker(QRunnable):
+class AsyncWorker:
+    """Runs a coroutine on the shared background loop, reporting its end through Qt signals."""
     def __init__(self, async_func, *args):
-        super().__init__()
         self.async_func = async_func
         self.args = args
         self.signals = AsyncSignals()
 
-    @pyqtSlot()
-    def run(self):
+    def start(self):
+        loop_thread.submit(self.async_func(*self.args)).add_done_callback(self.on_done)
+
+    def on_done(self, future):
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.async_func(*self.args))
+            future.result()
+        except concurrent.futures.CancelledError:
+            pass  # Cancelled by the app exiting
         except Exception as e:
             self.signals.error.emit(str(e))
             print(f"AsyncWorker error: {e}")
@@ -34,6 +51,34 @@ class AsyncWorker(QRunnable):
             self.signals.finished.emit()
 
 
+class InventorySignals(QObject):
+    chunk = pyqtSignal(object)
+    result = pyqtSignal(object)
+
+
+class InventoryWorker:
+    def __init__(self):
+        self.signals = InventorySignals()
+
+    def run(self):
+        apps = []
+        try:
+            # Stream the apps out in chunks as they are parsed, then cache the whole inventory
+            for app in inventory.iter_inventory():
+                apps.append(app)
+                if len(apps) % INVENTORY_CHUNK_SIZE == 0:
+                    self.signals.chunk.emit(apps[-INVENTORY_CHUNK_SIZE:])
+            if len(apps) % INVENTORY_CHUNK_SIZE:
+                self.signals.chunk.emit(apps[-(len(apps) % INVENTORY_CHUNK_SIZE):])
+
+            if apps:
+                inventory.save_cached_inventory(apps)
+        except Exception:
+            logging.exception("Could not collect the installed apps")
+        finally:
+            self.signals.result.emit(apps)
+
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -41,13 +86,17 @@ class MainWindow(QWidget):
         self.setGeometry(100, 100, 600, 565)
         self.setWindowIcon(QIcon("icon.ico"))
 
-        # Fetch the app lists
-        self.exclusions_list = gui_functions.load_exclusions()
-        self.apps_list = gui_functions.get_installed_apps()
-        self.updates_list = gui_functions.get_update_list(self.apps_list, self.exclusions_list)
-
-        # Set up variables for QThread
-        self.threadpool = QThreadPool()
+        # Fetch the app lists from the cache, the full inventory is collected after the window is shown
+        self.settings = settings.load_settings()
+        self.exclusions = exclusions.load_exclusions()
+        cache = inventory.load_cached_inventory()
+        self.apps_list = cache["apps"] if cache else []
+        self.updates_list = inventory.get_update_list(self.apps_list, self.exclusions)
+
+        # Set up variables for the background work, which all runs on the shared loop thread
+        self.inventory_refreshing = False  # Only one background inventory refresh runs at a time
+        self.inventory_loading = False  # Whether the lists are still being filled in on startup
+        self.first_paint_logged = False  # Check to only measure the time to the first paint once
         self.concurrent_update_number = 2  # How many apps update at once
         self.warning_not_shown = True  # Check to only show the update number warning once
         self.manager = None  # Placeholder for check_updates()
@@ -56,6 +105,30 @@ class MainWindow(QWidget):
         self._init_ui()
         self.load_styles()
 
+        # Update events are shown in batches once a frame, so many apps updating at once do not flood the GUI thread
+        self.events = EventAggregator(self)
+        self.events.status_lines.connect(self.append_status_lines)
+        self.events.progress.connect(self.progress_bar.setValue)
+        self.events.app_progress.connect(self.show_app_progress)
+        self.events.eta.connect(self.show_eta)
+
+        # Stream in the app list if there is no cache, or revalidate a stale cached app list in the background
+        if not cache:
+            self.inventory_loading = True
+            self.status_box.append("<i>Loading installed apps...</i>")
+            self.refresh_inventory()
+        elif not inventory.is_cache_fresh(cache, self.settings["inventory_cache_ttl"]):
+            self.refresh_inventory()
+        else:
+            logging.info(f"Startup: inventory loaded from cache after {time.perf_counter() - STARTUP_TIME:.2f}s")
+
+    def paintEvent(self, event):
+        """Logs the time from startup to the first paint of the window."""
+        super().paintEvent(event)
+        if not self.first_paint_logged:
+            self.first_paint_logged = True
+            logging.info(f"Startup: first paint after {time.perf_counter() - STARTUP_TIME:.2f}s")
+
     def load_styles(self):
         """Loads the app's CSS from gui_styles.qss."""
         qss_path = gui_functions.resource_path("gui_styles.qss")
@@ -85,7 +158,7 @@ class MainWindow(QWidget):
         # Stack of Views
         self.stack = QStackedWidget()
         self.view_widgets = {"updates": self.create_list_view("Apps to Update", self.updates_list),
-                             "excluded": self.create_list_view("Skipped Updates", self.exclusions_list),
+                             "excluded": self.create_list_view("Skipped Updates", self.exclusions),
                              "installed": self.create_list_view("Installed Apps", self.apps_list)}
 
         self.stack.addWidget(self.view_widgets["updates"])
@@ -135,6 +208,10 @@ class MainWindow(QWidget):
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
 
+        # Time left, predicted from earlier update durations
+        self.eta_label = QLabel()
+        self.eta_label.hide()
+
         # Settings button
         self.settings_btn = QPushButton()
         self.settings_btn.setIcon(QIcon(gui_functions.resource_path("settings.ico")))
@@ -143,6 +220,7 @@ class MainWindow(QWidget):
         self.settings_btn.clicked.connect(self.open_settings_dialog)
 
         settings_layout.addWidget(self.progress_bar)
+        settings_layout.addWidget(self.eta_label)
         settings_layout.addWidget(self.settings_btn)
         main_layout.addLayout(settings_layout)
 
@@ -179,38 +257,7 @@ class MainWindow(QWidget):
         list_widget.setFont(QFont("Arial", 10))
 
         for app in data_list:
-            if isinstance(app, dict):  # Ensure app is a dictionary
-                name = app.get("name", "Unknown")
-                version = app.get("version", "Unknown")
-                available_version = app.get("available", "Unknown")
-            else:
-                # Handle the case where `app` is not a dictionary
-                name = version = available_version = "Invalid data"
-
-            # Format the list entries
-            if title == "Apps to Update":
-                text = f"{name} - {version} -> {available_version}"
-            elif title == "Installed Apps":
-                text = f"{name} - {version}"
-            else:
-                text = name
-
-            item = QListWidgetItem(text)
-            item.setData(Qt.ItemDataRole.UserRole, app)
-
-            # Set checkbox only for update list
-            if title == "Apps to Update":
-                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-                item.setCheckState(Qt.CheckState.Unchecked)
-
-            # If updates are not supported, visually denote that
-            if app.get("source", "") == "":
-                font = item.font()
-                font.setItalic(True)
-                item.setFont(font)
-                item.setBackground(QColor("#4e1e1e"))
-
-            list_widget.addItem(item)
+            list_widget.addItem(self.create_list_item(title, app))
 
         if title == "Apps to Update":
             list_widget.itemChanged.connect(self.update_button_states)
@@ -220,6 +267,115 @@ class MainWindow(QWidget):
         box.setLayout(layout)
         return box
 
+    def create_list_item(self, title, app):
+        """Creates a single entry for one of the QStackWidget lists."""
+        if isinstance(app, inventory.AppRecord):  # Ensure app is an app record
+            name = app.name
+            version = app.version
+            available_version = app.available
+        else:
+            # Handle the case where `app` is not an app record
+            name = version = available_version = "Invalid data"
+
+        # Format the list entries
+        if title == "Apps to Update":
+            text = f"{name} - {version} -> {available_version}"
+        elif title == "Installed Apps":
+            text = f"{name} - {version}"
+        else:
+            text = name
+
+        item = QListWidgetItem(text)
+        item.setData(Qt.ItemDataRole.UserRole, app)
+
+        # Set checkbox only for update list
+        if title == "Apps to Update":
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+
+        # If updates are not supported, visually denote that
+        if not isinstance(app, inventory.AppRecord) or app.source == "":
+            font = item.font()
+            font.setItalic(True)
+            item.setFont(font)
+            item.setBackground(QColor("#4e1e1e"))
+
+        return item
+
+    def refresh_inventory(self):
+        """Collects the installed apps in the background, then applies the differences to the lists."""
+        if self.inventory_refreshing:
+            return
+        self.inventory_refreshing = True
+
+        inventory_worker = InventoryWorker()
+        if self.inventory_loading:
+            inventory_worker.signals.chunk.connect(self.add_inventory_chunk)
+        inventory_worker.signals.result.connect(self.apply_inventory)
+        # Collecting the inventory blocks, so it runs in the background loop's thread pool
+        AsyncWorker(asyncio.to_thread, inventory_worker.run).start()
+
+    def add_inventory_chunk(self, apps):
+        """Adds a chunk of freshly parsed apps to the lists while the inventory is loading."""
+        updates = inventory.get_update_list(apps, self.exclusions)
+        self.apply_list_changes("installed", [], apps)
+        self.apply_list_changes("updates", [], updates)
+        self.apps_list = self.apps_list + apps
+        self.updates_list = self.updates_list + updates
+
+    def apply_inventory(self, apps):
+        """Replaces the app lists with a newly collected inventory, only touching entries that changed."""
+        self.inventory_refreshing = False
+        if self.inventory_loading:
+            self.inventory_loading = False
+            logging.info(f"Startup: full inventory after {time.perf_counter() - STARTUP_TIME:.2f}s")
+            self.status_box.clear()
+            if not apps:
+                self.status_box.append("<font color='red'>Could not load the installed apps.</font>")
+            self.update_button_states()
+
+        if not apps:  # Collection failed, keep showing what we have
+            return
+        if inventory.get_inventory_fingerprint(apps) == inventory.get_inventory_fingerprint(self.apps_list):
+            return
+
+        updates_list = inventory.get_update_list(apps, self.exclusions)
+        self.apply_list_changes("installed", self.apps_list, apps)
+        self.apply_list_changes("updates", self.updates_list, updates_list)
+        self.apps_list = apps
+        self.updates_list = updates_list
+
+        self.update_button_states()
+
+    def apply_list_changes(self, view, old_list, new_list):
+        """Removes, adds and replaces only the entries of a list view that differ between two app lists."""
+        added, removed, changed = inventory.diff_inventory(old_list, new_list)
+        if not (added or removed or changed):
+            return
+
+        title = self.view_widgets[view].title()
+        list_widget = self.view_widgets[view].findChild(QListWidget)
+        list_widget.blockSignals(True)  # Prevent premature signal triggering
+
+        # Take out the outdated entries, remembering which ones were checkmarked
+        stale_ids = {app.id for app in removed + changed}
+        checked_ids = set()
+        for i in reversed(range(list_widget.count())):
+            app = list_widget.item(i).data(Qt.ItemDataRole.UserRole)
+            if app.id in stale_ids:
+                if list_widget.item(i).checkState() == Qt.CheckState.Checked:
+                    checked_ids.add(app.id)
+                list_widget.takeItem(i)
+
+        for app in added + changed:
+            item = self.create_list_item(title, app)
+            if app.id in checked_ids:
+                item.setCheckState(Qt.CheckState.Checked)
+            list_widget.addItem(item)
+
+        list_widget.sortItems(Qt.SortOrder.AscendingOrder)
+        list_widget.blockSignals(False)
+
     def switch_view(self, index, button):
         """Switches which list (and associated button) is currently active in the GUI."""
         # Remove the 'active' property from all buttons
@@ -271,13 +427,14 @@ class MainWindow(QWidget):
             self.toggle_btn.clicked.disconnect()
             self.toggle_btn.clicked.connect(self.exclude_app)
 
-        # Enable "Start Updates" if update list has entries
-        self.start_btn.setEnabled(bool(self.view_widgets["updates"].findChild(QListWidget).count()))
+        # Enable "Start Updates" if update list has entries and has finished loading
+        self.start_btn.setEnabled(bool(self.view_widgets["updates"].findChild(QListWidget).count())
+                                  and not self.inventory_loading)
 
         # Enable "Update Selected Apps" if at least one checkbox is checked
         update_list = self.view_widgets["updates"].findChild(QListWidget)
         has_checked = any(update_list.item(i).checkState() == Qt.CheckState.Checked for i in range(update_list.count()))
-        self.selected_btn.setEnabled(has_checked)
+        self.selected_btn.setEnabled(has_checked and not self.inventory_loading)
 
     def exclude_app(self):
         """Moves an app from the installed apps/available updates lists to the excluded apps list."""
@@ -287,20 +444,19 @@ class MainWindow(QWidget):
             # Fetch the app with all of it's data
             app = selected_item.data(Qt.ItemDataRole.UserRole)
             if app:
-                app_name = app.get("name")
+                app_name = app.name
+                app_key = exclusions.get_exclusion_key(app)
 
                 # Remove from updates list if present
-                self.updates_list = [a for a in self.updates_list if a.get("name") != app_name]
+                self.updates_list = [a for a in self.updates_list if exclusions.get_exclusion_key(a) != app_key]
                 updates_widget = self.view_widgets["updates"].findChild(QListWidget)
                 for i in range(updates_widget.count()):
-                    if updates_widget.item(i).data(Qt.ItemDataRole.UserRole).get("name") == app_name:
+                    if exclusions.get_exclusion_key(updates_widget.item(i).data(Qt.ItemDataRole.UserRole)) == app_key:
                         updates_widget.takeItem(i)
                         break
 
                 # Only add to exclusions if not already there
-                if app_name not in [a["name"] for a in self.exclusions_list]:
-                    self.exclusions_list.append(app)
-                    gui_functions.save_exclusions(self.exclusions_list)
+                if self.exclusions.add(app):
 
                     exclusions_widget = self.view_widgets["excluded"].findChild(QListWidget)
                     item = QListWidgetItem(app_name)
@@ -318,26 +474,25 @@ class MainWindow(QWidget):
         if selected_item:
             # Fetch the app with all of it's data
             app = selected_item.data(Qt.ItemDataRole.UserRole)
-            app_name = app.get("name")
+            app_name = app.name
 
             # Remove from exclusions list
-            self.exclusions_list = [a for a in self.exclusions_list if a.get("name") != app_name]
+            self.exclusions.remove(app)
             exclusions_widget.takeItem(exclusions_widget.row(selected_item))
 
-            if app.get("available"):
-                # Add back to updates list if it has an update
-                if app_name not in [a.get("name") for a in self.updates_list]:
-                    self.updates_list.append(app)
+            # Add back to updates list if it has an update
+            app_key = exclusions.get_exclusion_key(app)
+            if app.available and not any(exclusions.get_exclusion_key(a) == app_key for a in self.updates_list):
+                self.updates_list.append(app)
 
                 updates_widget = self.view_widgets["updates"].findChild(QListWidget)
-                item = QListWidgetItem(f"{app_name} - {app['version']} -> {app['available']}")
+                item = QListWidgetItem(f"{app_name} - {app.version} -> {app.available}")
                 item.setData(Qt.ItemDataRole.UserRole, app)
                 item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
                 item.setCheckState(Qt.CheckState.Unchecked)
                 updates_widget.addItem(item)
                 updates_widget.sortItems(Qt.SortOrder.AscendingOrder)
 
-            gui_functions.save_exclusions(self.exclusions_list)
             self.update_button_states()
 
     def start_update(self, apps_to_update):
@@ -345,6 +500,7 @@ class MainWindow(QWidget):
         # Reset GUI progress widgets
         self.status_box.clear()
         self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
 
         # Remove update buttons, show stop button
         self.start_btn.hide()
@@ -352,54 +508,34 @@ class MainWindow(QWidget):
         self.stop_btn.show()
 
         # Ensure no malformed entries are sent to the function
-        clean_updates = [app for app in apps_to_update if isinstance(app, dict) and "name" in app and "id" in app]
+        clean_updates = [app for app in apps_to_update if isinstance(app, inventory.AppRecord)]
         if not clean_updates:
             self.status_box.append("<font color='red'>No valid apps to update.</font>")
             return
 
-        # Setup variables and signals for the QThread
-        self.manager = UpdateManager(concurrent_limit=self.concurrent_update_number)
+        # Setup variables and signals for the background loop
+        self.manager = UpdateManager(concurrent_limit=self.concurrent_update_number,
+                                     update_mode=self.settings["update_mode"],
+                                     adaptive=self.settings["adaptive_concurrency"],
+                                     schedule=self.settings["schedule_policy"],
+                                     timeout=self.settings["update_timeout"],
+                                     stall_timeout=self.settings["stall_timeout"])
         self.manager.stop_requested = False
-        self.manager.update_progress.connect(self.update_status)
-        self.manager.update_app_being_processed.connect(
-            lambda name: self.status_box.append(f"<b>Processing:</b> {name}")
-        )
+        self.events.connect_manager(self.manager)
         self.manager.completed.connect(self.on_update_complete)
+        self.events.start()
 
-        # Call the update function in the new thread
+        # Run the update function on the background loop
         async_worker = AsyncWorker(self.manager.check_and_install, clean_updates)
         async_worker.signals.error.connect(self.show_error_message)
-        self.threadpool.start(async_worker)
+        async_worker.start()
 
     def on_update_complete(self):
         """Fetches the new app and update lists after the update process is completed, and refreshes them in the GUI."""
-        self.apps_list = gui_functions.get_installed_apps()
-        self.updates_list = gui_functions.get_update_list(self.apps_list, self.exclusions_list)
-
-        updates_widget = self.view_widgets["updates"].findChild(QListWidget)
-        updates_widget.blockSignals(True)  # Prevent premature signal triggering
-        updates_widget.clear()  # Clears the QListWidget
-
-        # Adds back entries to the QListWidget
-        for app in self.updates_list:
-            name = app.get("name", "Unknown")
-            version = app.get("version", "Unknown")
-            available = app.get("available", "Unknown")
-
-            item = QListWidgetItem(f"{name} - {version} -> {available}")
-            item.setData(Qt.ItemDataRole.UserRole, app)
-            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-            item.setCheckState(Qt.CheckState.Unchecked)
-
-            if app.get("source", "") == "":
-                font = item.font()
-                font.setItalic(True)
-                item.setFont(font)
-
-            updates_widget.addItem(item)
-
-        updates_widget.sortItems(Qt.SortOrder.AscendingOrder)
-        updates_widget.blockSignals(False)
+        self.events.stop()
+        self.refresh_inventory()
+        self.progress_bar.setFormat("%p%")
+        self.eta_label.hide()
 
         # Return update buttons, remove stop button
         self.start_btn.show()
@@ -426,7 +562,7 @@ class MainWindow(QWidget):
     def stop_updates(self):
         """Stops the ongoing update process."""
         if self.manager:
-            self.manager.stop_requested = True
+            self.manager.request_stop()
             self.status_box.append("<font color='orange'>Update process has been requested to stop...</font>")
 
     def open_settings_dialog(self):
@@ -435,7 +571,7 @@ class MainWindow(QWidget):
         dialog.setObjectName("SettingsDialog")
         dialog.setWindowTitle("Settings")
         dialog.setModal(True)
-        dialog.setFixedSize(270, 100)
+        dialog.setFixedSize(270, 265)
 
         layout = QVBoxLayout()
         layout.setContentsMargins(15, 15, 15, 15)
@@ -457,6 +593,79 @@ class MainWindow(QWidget):
         row_layout.addWidget(combo)
         layout.addLayout(row_layout)
 
+        # Adaptive concurrency, the number above becomes the upper bound
+        adaptive_check = QCheckBox("Adjust Automatically to System Load")
+        adaptive_check.setObjectName("SettingsLabel")
+        adaptive_check.setToolTip("Updates up to the number of apps above at once, fewer while the system is busy.")
+        adaptive_check.setChecked(self.settings["adaptive_concurrency"])
+        adaptive_check.toggled.connect(lambda checked: self.handle_setting_change("adaptive_concurrency", checked))
+        layout.addWidget(adaptive_check)
+
+        # Row for updating apps one winget call at a time or in groups
+        mode_layout = QHBoxLayout()
+
+        mode_label = QLabel("Update Mode:")
+        mode_label.setObjectName("SettingsLabel")
+
+        mode_options = {"Per App": PER_APP, "Batched": BATCH}
+        mode_combo = QComboBox()
+        mode_combo.setObjectName("SettingsComboBox")
+        mode_combo.addItems(list(mode_options))
+        mode_combo.setCurrentText(next((text for text, mode in mode_options.items()
+                                        if mode == self.settings["update_mode"]), "Per App"))
+        mode_combo.currentTextChanged.connect(lambda text: self.handle_setting_change("update_mode",
+                                                                                     mode_options[text]))
+
+        mode_layout.addWidget(mode_label)
+        mode_layout.addWidget(mode_combo)
+        layout.addLayout(mode_layout)
+
+        # Row for the order apps are updated in, based on how long they took before
+        order_layout = QHBoxLayout()
+
+        order_label = QLabel("Update Order:")
+        order_label.setObjectName("SettingsLabel")
+
+        order_options = {"List Order": scheduling.LIST_ORDER, "Shortest First": scheduling.SHORTEST_FIRST,
+                         "Longest First": scheduling.LONGEST_FIRST}
+        order_combo = QComboBox()
+        order_combo.setObjectName("SettingsComboBox")
+        order_combo.setToolTip("Shortest First finishes most apps early, Longest First finishes all of them sooner.")
+        order_combo.addItems(list(order_options))
+        order_combo.setCurrentText(next((text for text, policy in order_options.items()
+                                         if policy == self.settings["schedule_policy"]), "List Order"))
+        order_combo.currentTextChanged.connect(lambda text: self.handle_setting_change("schedule_policy",
+                                                                                      order_options[text]))
+
+        order_layout.addWidget(order_label)
+        order_layout.addWidget(order_combo)
+        layout.addLayout(order_layout)
+
+        # Row for how long the cached app list is used before refreshing it
+        ttl_layout = QHBoxLayout()
+
+        ttl_label = QLabel("Refresh App List After:")
+        ttl_label.setObjectName("SettingsLabel")
+
+        ttl_options = {"15 minutes": 900, "1 hour": 3600, "6 hours": 21600, "1 day": 86400}
+        ttl_combo = QComboBox()
+        ttl_combo.setObjectName("SettingsComboBox")
+        ttl_combo.addItems(list(ttl_options))
+        current_ttl = [text for text, seconds in ttl_options.items() if seconds == self.settings["inventory_cache_ttl"]]
+        ttl_combo.setCurrentText(current_ttl[0] if current_ttl else "1 hour")
+        ttl_combo.currentTextChanged.connect(lambda text: self.handle_setting_change("inventory_cache_ttl",
+                                                                                    ttl_options[text]))
+
+        ttl_layout.addWidget(ttl_label)
+        ttl_layout.addWidget(ttl_combo)
+        layout.addLayout(ttl_layout)
+
+        # Forced refresh button
+        refresh_btn = QPushButton("Refresh App List Now")
+        refresh_btn.setObjectName("SettingsCloseButton")
+        refresh_btn.clicked.connect(self.refresh_inventory)
+        layout.addWidget(refresh_btn)
+
         # Close button
         close_btn = QPushButton("Close")
         close_btn.setObjectName("SettingsCloseButton")
@@ -473,21 +682,26 @@ class MainWindow(QWidget):
             gui_functions.show_warning("Running more than 5 concurrent updates may slow down your system.")
             self.warning_not_shown = False
 
-    def update_status(self, progress, message):
-        """Prints the update status of apps in the update process to the status box."""
-        self.progress_bar.setValue(progress)
-        if "Successfully updated" in message:
-            self.status_box.append(f"<font color='green'>{message}</font>")
-        elif "No available update" in message:
-            # Extract the app name from the message (assuming it's in the format "No available update: <app_name>")
-            app_name = message.split(":")[-1].strip() if ":" in message else "Unknown App"
-            self.status_box.append(f"<font color='green'>Successfully updated: {app_name}</font>")
-
-            # self.status_box.append(f"<font color='yellow'>{message}</font>")  <-- Original code, updates always succeed though
-        elif "Could not be updated" in message:
-            self.status_box.append(f"<font color='red'>{message}</font>")
+    def handle_setting_change(self, key, value):
+        """Stores a changed setting and saves it to AppData."""
+        self.settings[key] = value
+        settings.save_settings(self.settings)
+
+    def show_app_progress(self, name, percent):
+        """Shows how far along the most recently reported app is next to the overall percentage."""
+        self.progress_bar.setFormat(f"%p%   ({name}: {percent}%)")
+
+    def show_eta(self, seconds):
+        """Shows the predicted time left next to the progress bar."""
+        if seconds < 60:
+            self.eta_label.setText("Less than a minute left")
         else:
-            self.status_box.append(message)
+            self.eta_label.setText(f"About {round(seconds / 60)} min left")
+        self.eta_label.show()
+
+    def append_status_lines(self, lines):
+        """Prints a frame's worth of update status lines to the status box at once."""
+        self.status_box.append("<br>".join(lines))
 
     def show_error_message(self, message):
         """Prints an error message in the status text box."""
@@ -499,20 +713,31 @@ class MainWindow(QWidget):
             reply = QMessageBox.question(
                 self,
                 "Confirm Exit",
-                "Updates are still running. Are you sure you want to exit?\n The currently running updates will still finish.",
+                "Updates are still running. Are you sure you want to exit?\n The currently running updates will be stopped.",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.Yes:
                 self.stop_updates()
+                self.exclusions.close()
+                loop_thread.shutdown_loop_thread()
+                powershell_host.shutdown_host()
+                history.shutdown_store()
+                tracing.shutdown_tracing()
                 event.accept()
             else:
                 event.ignore()
         else:
             self.stop_updates()
+            self.exclusions.close()
+            loop_thread.shutdown_loop_thread()
+            powershell_host.shutdown_host()
+            history.shutdown_store()
+            tracing.shutdown_tracing()  # After the loop thread, so the winget calls it killed are in the trace
             event.accept()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     application = QApplication(sys.argv)
     gui_functions.check_winget()
     gui_functions.check_winget_module()
@@ -1,14 +1,10 @@
-import difflib
-import json
 import os
-import re
 import subprocess
 import sys
 from PyQt6.QtWidgets import QMessageBox
-
-# Constants
-EXCLUSIONS_DIR = os.path.join(os.getenv("LOCALAPPDATA"), "Software Updater")
-EXCLUSIONS_FILE = os.path.join(EXCLUSIONS_DIR, "exclusions.json")
+import inventory
+import powershell_host
+import tracing
 
 
 def show_error(message: str):
@@ -35,14 +31,15 @@ def show_warning(message: str):
 def check_winget():
     """Checks whether winget is installed. Installs it if missing."""
     try:
-        subprocess.run(
-            ["winget", "--version"],
-            check=True,
-            shell=False,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
+        with tracing.span("winget", "process", command="winget --version"):
+            subprocess.run(
+                ["winget", "--version"],
+                check=True,
+                shell=False,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=subprocess.CREATE_NO_WINDOW
+            )
     except FileNotFoundError:
         install_winget_cli()
     except subprocess.CalledProcessError:
@@ -84,14 +81,16 @@ def install_winget_cli():
     exit 0
     '''
 
-    result = subprocess.run(
-        ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", powershell_script],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        shell=False,
-        creationflags=subprocess.CREATE_NO_WINDOW
-    )
+    with tracing.span("powershell", "process", command="install winget") as span:
+        result = subprocess.run(
+            ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", powershell_script],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            shell=False,
+            creationflags=subprocess.CREATE_NO_WINDOW
+        )
+        span.set(exit_code=result.returncode, output_chars=len(result.stdout) + len(result.stderr))
 
     if "installed" not in result.stdout.lower() or result.returncode != 0:
         show_error(f"Failed to install winget:\n\n{result.stdout.strip()}\n{result.stderr.strip()}")
@@ -113,7 +112,7 @@ def check_winget_module():
     # Check if already installed
     if (Get-Module -ListAvailable -Name $moduleName) {
         Write-Output "INSTALLED"
-        exit 0
+        return
     }
 
     # Check if running as admin
@@ -122,7 +121,7 @@ def check_winget_module():
 
     if (-not $isAdmin) {
         Write-Output "NEED_ADMIN"
-        exit 1
+        return
     }
 
     # Install NuGet provider (required by PowerShellGet)
@@ -139,30 +138,26 @@ def check_winget_module():
         Import-Module PowerShellGet -Force
     } catch {
         Write-Output "FAILED: PowerShellGet update failed: $($_.Exception.Message)"
-        exit 2
+        return
     }
 
     # Now install Microsoft.WinGet.Client
     try {
         Install-Module -Name $moduleName -Repository PSGallery -Scope AllUsers -Force -Confirm:$false -AllowClobber
         Write-Output "INSTALLED_SUCCESS"
-        exit 0
+        return
     } catch {
         Write-Output "FAILED: Module install failed: $($_.Exception.Message)"
-        exit 3
+        return
     }
     '''
 
-    result = subprocess.run(
-        ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", ps_script],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        shell=False,
-        creationflags=subprocess.CREATE_NO_WINDOW,
-    )
-
-    output = result.stdout.strip()
+    # Runs in the shared PowerShell host, which keeps the module imported for the later inventory queries
+    try:
+        output = powershell_host.get_host().run(ps_script).strip()
+    except (powershell_host.PowerShellHostError, OSError) as e:
+        show_error(f"Failed to run PowerShell:\n\n{e}")
+        return
 
     if "INSTALLED" in output or "INSTALLED_SUCCESS" in output:
         return
@@ -171,144 +166,12 @@ def check_winget_module():
     elif "FAILED" in output:
         show_error(f"Failed to install Microsoft.WinGet.Client:\n\n{output}")
     else:
-        show_error(f"Unknown error occurred:\n\n{output}\n{result.stderr.strip()}")
-
-
-def load_exclusions() -> list[dict]:
-    """Loads exclusions from the exclusions.json file in AppData."""
-    try:
-        with open(EXCLUSIONS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-
-def save_exclusions(exclusions: list[dict]):
-    """Saves exclusions to the exclusions.json file in AppData."""
-    with open(EXCLUSIONS_FILE, "w", encoding="utf-8") as f:
-        json.dump(exclusions, f, indent=4)
+        show_error(f"Unknown error occurred:\n\n{output}")
 
 
-def get_installed_apps():
+def get_installed_apps(sources=()):
     """Gets a list of installed applications using winget and parses the output."""
-    try:
-        # Get the full app names using PowerShell command
-        names_result = subprocess.run(
-            ["powershell", "-Command", "Get-WinGetPackage | Select Name"],
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-
-        # Get the name, id, version, availability, and source from WinGet using PowerShell command
-        winget_result = subprocess.run(
-            ["winget", "list", "--accept-source-agreements"],
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-
-        # Parse clean full names
-        full_names = [line.strip() for line in names_result.stdout.splitlines() if line.strip()]
-
-        # Parse winget list output
-        winget_lines = winget_result.stdout.splitlines()[8:]
-        winget_lines = [line.strip().replace('â€¦', '   ') for line in winget_lines if line.strip()]
-
-        # Create a list to store app details
-        apps = []
-        used_names = set()
-        for line in winget_lines:
-            # Regex to match name, id, version, available, and source
-            match = re.match(
-                r"^(?P<name>.+?)\s{2,}(?P<id>\S+)\s{2,}(?P<version>\S+|Unknown)(?:\s{2,}(?P<available>\S+))?(?:\s{2,}(?P<source>\S+))?$",
-                line.strip()
-            )
-
-            if match:
-                # Splits the match into the found components
-                parts = re.split(r'\s{2,}', line)
-
-                if len(parts) < 3:
-                    continue  # Skip malformed lines
-
-                winget_name = parts[0]
-                if winget_name == "Name":  # Since the name column can still sneak through, hardcoded it out
-                    pass
-                app_id = parts[1]
-                version = parts[2] if parts[2] != '' else 'Unknown'
-                available = ''
-                source = ''
-
-                if len(parts) >= 5:
-                    available = parts[3]
-                    source = parts[4]
-                elif len(parts) == 4:
-                    # Heuristic for version-vs-source
-                    if re.match(r"^\d+(\.\d+)*$", parts[3]):
-                        available = parts[3]
-                    else:
-                        source = parts[3]
-
-                resolved_name = get_best_full_name(winget_name, full_names, used_names)
-
-                # In case of the ID being malformed, show app in app list but remove all data
-                if not app_id or not re.match(r"^[\w\.\-\+]+$", app_id):
-                    source = ""
-                    available = ""
-                    version = "Unknown"
-
-                used_names.add(resolved_name)
-
-                apps.append({
-                    "name": resolved_name,
-                    "id": app_id,
-                    "version": version,
-                    "available": available,
-                    "source": source
-                })
-
-        return apps
-
-    except subprocess.CalledProcessError:
-        return []
-
-
-def get_update_list(apps_list, exclusions_list):
-    """Add apps to the update list when the application is run."""
-    apps = []
-    for app in apps_list:
-        if app not in exclusions_list and app["available"] != "":
-            apps.append(app)
-
-    return apps
-
-
-def get_best_full_name(raw_name, full_names, used_names):
-    """Tries matching the best full name possible from a cut-off name."""
-    raw_name = raw_name.strip()
-
-    # Tier 1: Exact match
-    if raw_name in full_names and raw_name not in used_names:
-        return raw_name
-
-    # Tier 2: Startswith match (prefer longest, unused)
-    startswith_matches = [name for name in full_names if name.startswith(raw_name) and name not in used_names]
-    if startswith_matches:
-        return max(startswith_matches, key=lambda name: len(name))
-
-    # Tier 3: Fuzzy match — ensure uniqueness
-    fuzzy_matches = difflib.get_close_matches(raw_name, full_names, n=5, cutoff=0.6)
-    for match in fuzzy_matches:
-        if match not in used_names:
-            return match
-
-    # Fallback
-    return raw_name
+    return inventory.collect_inventory(sources)
 
 
 def resource_path(filename: str) -> str:
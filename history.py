@@ -0,0 +1,217 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import settings
+
+# Constants
+HISTORY_FILE = os.path.join(settings.APP_DATA_DIR, "history.sqlite3")
+FAILURE_OUTCOMES = ("failed", "transient", "timed_out", "stalled", "error")  # Outcomes of engine.py counted as failures
+IGNORED_OUTCOMES = ("cancelled",)  # Attempts stopped by the user say nothing about the package
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    ended REAL,
+    mode TEXT,
+    concurrency INTEGER,
+    apps INTEGER,
+    completed INTEGER,
+    stopped INTEGER
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT REFERENCES runs(id),
+    package TEXT NOT NULL,
+    name TEXT,
+    started REAL NOT NULL,
+    ended REAL NOT NULL,
+    selector TEXT,
+    exit_code INTEGER,
+    bytes INTEGER,
+    version_before TEXT,
+    version_after TEXT,
+    outcome TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_by_package ON attempts (package, started);
+"""
+
+
+class HistoryStore:
+    """Every update run and app attempt in a local SQLite database, committed in batches by a background thread."""
+
+    def __init__(self, path=HISTORY_FILE, flush_interval=0.5, batch_size=200):
+        self.path = path
+        self.flush_interval = flush_interval  # Seconds to wait for more writes before committing
+        self.batch_size = batch_size  # Most writes committed in one transaction
+        self.writes = queue.Queue()
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens the database, creating it on first use."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")  # Queries do not wait for the writer
+        connection.executescript(SCHEMA)
+        return connection
+
+    def write(self, sql, params):
+        """Queues a statement for the writer thread, starting it on first use."""
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_loop, daemon=True)
+                self.writer.start()
+        self.writes.put((sql, params))
+
+    def write_loop(self):
+        """Commits queued statements in batches until close() is called."""
+        try:
+            connection = self.connect()
+        except (sqlite3.Error, OSError) as e:
+            # Keep taking the writes off the queue, so flush() and close() do not wait on them forever
+            logging.error(f"Could not open {self.path}, the history is not recorded: {e}")
+            connection = None
+        closing = False
+        while not closing:
+            batch = [self.writes.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.writes.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            closing = batch[-1] is None
+            statements = [item for item in batch if item is not None]
+            try:
+                if connection is not None:
+                    with connection:  # One transaction per batch
+                        for sql, params in statements:
+                            connection.execute(sql, params)
+            except sqlite3.Error as e:
+                logging.error(f"Could not write {len(statements)} history entries: {e}")
+            for _ in batch:
+                self.writes.task_done()
+        if connection is not None:
+            connection.close()
+
+    def flush(self):
+        """Waits until everything queued so far has been written."""
+        if self.writer is not None:
+            self.writes.join()
+
+    def close(self):
+        """Writes out the queued entries and stops the writer thread. Called when the app exits."""
+        with self.lock:
+            if self.writer is None:
+                return
+            self.writes.put(None)
+            self.writer.join(timeout=10)
+            self.writer = None
+
+    def start_run(self, mode, concurrency, apps) -> str:
+        """Records the start of an update run and returns its id."""
+        run_id = uuid.uuid4().hex
+        self.write("INSERT INTO runs (id, started, mode, concurrency, apps) VALUES (?, ?, ?, ?, ?)",
+                   (run_id, time.time(), mode, concurrency, apps))
+        return run_id
+
+    def end_run(self, run_id, completed, stopped, apps=None):
+        """Records the end of an update run, and how many apps it had if they were only known while it ran."""
+        self.write("UPDATE runs SET ended = ?, completed = ?, stopped = ?, apps = COALESCE(?, apps) WHERE id = ?",
+                   (time.time(), completed, int(stopped), apps, run_id))
+
+    def record_attempt(self, run_id, package, name, started, ended, outcome, selector=None, exit_code=None,
+                       download_bytes=None, version_before=None, version_after=None):
+        """Records a single attempt at updating an app."""
+        self.write("INSERT INTO attempts (run_id, package, name, started, ended, selector, exit_code, bytes, "
+                   "version_before, version_after, outcome) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (run_id, package, name, started, ended, selector, exit_code, download_bytes, version_before,
+                    version_after, outcome))
+
+    def query(self, sql, params=()) -> list:
+        """Runs a read query on its own connection, after the queued writes."""
+        self.flush()
+        connection = self.connect()
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def slowest_packages(self, limit=10) -> list[tuple[str, str, float]]:
+        """The packages with the longest mean update duration, as (package, name, seconds)."""
+        return self.query(f"""
+            SELECT package, MAX(name), AVG(ended - started) AS seconds FROM attempts
+            WHERE outcome NOT IN ({", ".join("?" for _ in IGNORED_OUTCOMES)})
+            GROUP BY package ORDER BY seconds DESC LIMIT ?
+        """, (*IGNORED_OUTCOMES, limit))
+
+    def failure_rates(self, min_attempts=1) -> list[tuple[str, int, int, float]]:
+        """How often updating every package failed, as (package, attempts, failures, rate), worst first."""
+        failed = ", ".join("?" for _ in FAILURE_OUTCOMES)
+        ignored = ", ".join("?" for _ in IGNORED_OUTCOMES)
+        return self.query(f"""
+            SELECT package, COUNT(*) AS total, SUM(outcome IN ({failed})) AS failures,
+                   1.0 * SUM(outcome IN ({failed})) / COUNT(*) AS rate
+            FROM attempts WHERE outcome NOT IN ({ignored})
+            GROUP BY package HAVING total >= ? ORDER BY rate DESC, total DESC
+        """, (*FAILURE_OUTCOMES, *FAILURE_OUTCOMES, *IGNORED_OUTCOMES, min_attempts))
+
+    def mean_durations(self) -> dict[str, float]:
+        """The mean update duration of every package, in seconds."""
+        return dict(self.query(f"""
+            SELECT package, AVG(ended - started) FROM attempts
+            WHERE outcome NOT IN ({", ".join("?" for _ in IGNORED_OUTCOMES)}) GROUP BY package
+        """, IGNORED_OUTCOMES))
+
+    def recent_durations(self, kept=5, before=None) -> dict[str, list[float]]:
+        """The durations of the most recent attempts of every package, oldest first, optionally only before a time."""
+        durations = {}
+        for package, seconds in self.query(f"""
+            SELECT package, ended - started FROM (
+                SELECT package, started, ended,
+                       ROW_NUMBER() OVER (PARTITION BY package ORDER BY started DESC) AS recency
+                FROM attempts WHERE outcome NOT IN ({", ".join("?" for _ in IGNORED_OUTCOMES)}) AND started < ?
+            ) WHERE recency <= ? ORDER BY started
+        """, (*IGNORED_OUTCOMES, before if before is not None else float("inf"), kept)):
+            durations.setdefault(package, []).append(round(seconds, 2))
+        return durations
+
+    def finished_runs(self) -> list[tuple[str, float, float, int]]:
+        """The runs that completed without being stopped, as (id, started, ended, concurrency), oldest first."""
+        return self.query("""
+            SELECT id, started, ended, concurrency FROM runs
+            WHERE ended IS NOT NULL AND NOT stopped AND completed > 0 ORDER BY started
+        """)
+
+    def run_packages(self, run_id) -> list[str]:
+        """The packages attempted in a run, in the order they started."""
+        return [package for package, in self.query(
+            "SELECT package FROM attempts WHERE run_id = ? ORDER BY started", (run_id,))]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HistoryStore:
+    """Returns the session's shared history store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+            atexit.register(shutdown_store)
+        return _store
+
+
+def shutdown_store():
+    """Writes out the shared history store's queued entries, if it was used."""
+    with _store_lock:
+        if _store is not None:
+            _store.close()
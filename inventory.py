@@ -0,0 +1,593 @@
+import bisect
+import difflib
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import powershell_host
+import settings
+import tracing
+
+# Column keys of the winget table, in the order winget prints them
+WINGET_COLUMNS = ("name", "id", "version", "available", "source")
+WINGET_HEADERS = {"Name": "name", "Id": "id", "Version": "version", "Available": "available", "Source": "source"}
+
+ELLIPSIS = "…"
+MOJIBAKE_ELLIPSIS = "â€¦"  # UTF-8 ellipsis decoded as cp1252
+
+CACHE_FILE = os.path.join(settings.APP_DATA_DIR, "inventory_cache.json")
+CACHE_VERSION = 1
+
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Only defined on Windows
+
+# Installed packages as JSON objects, so no names are cut off like in the winget list table
+STRUCTURED_INVENTORY_SCRIPT = r'''
+$ErrorActionPreference = 'Stop'
+$ProgressPreference = 'SilentlyContinue'
+
+Get-WinGetPackage | ForEach-Object {
+    [PSCustomObject]@{
+        Name      = $_.Name
+        Id        = $_.Id
+        Version   = $_.InstalledVersion
+        Available = if ($_.IsUpdateAvailable) { $_.AvailableVersions[0] } else { '' }
+        Source    = $_.Source
+    }
+} | ConvertTo-Json -Compress
+'''
+
+
+@dataclass(frozen=True, slots=True)
+class AppRecord:
+    """An installed app, shared by the inventory, the GUI and the updater. Hashed by its package id."""
+    name: str
+    id: str
+    version: str = "Unknown"
+    available: str = ""
+    source: str = ""
+
+    def __post_init__(self):
+        # Versions and sources repeat a lot across an inventory, so only one copy of each is kept
+        object.__setattr__(self, "version", sys.intern(self.version))
+        object.__setattr__(self, "available", sys.intern(self.available))
+        object.__setattr__(self, "source", sys.intern(self.source))
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AppRecord":
+        """Reads an app from its JSON form, as stored in the cache and exclusion files."""
+        return cls(name=str(data.get("name") or data.get("id") or "Unknown"), id=str(data.get("id") or ""),
+                   version=str(data.get("version") or "Unknown"), available=str(data.get("available") or ""),
+                   source=str(data.get("source") or ""))
+
+    def to_dict(self) -> dict:
+        """Converts the app to its JSON form."""
+        return {"name": self.name, "id": self.id, "version": self.version, "available": self.available,
+                "source": self.source}
+
+
+def is_separator_line(line: str) -> bool:
+    """Checks whether a line is the dashed separator winget prints below the table header."""
+    stripped = line.strip()
+    return len(stripped) >= 10 and stripped.count("-") == len(stripped)
+
+
+def get_column_layout(header: str) -> list[tuple[str, int]]:
+    """Reads the start offset of every column from the winget table header."""
+    tokens = [(match.group(), match.start()) for match in re.finditer(r"\S+", header)]
+
+    # English headers can be mapped directly, localized ones are mapped by position
+    if tokens and all(text in WINGET_HEADERS for text, _ in tokens):
+        return [(WINGET_HEADERS[text], start) for text, start in tokens]
+    if len(tokens) == 4:  # The Available column is left out when no app has an update
+        fields = ("name", "id", "version", "source")
+    else:
+        fields = WINGET_COLUMNS
+    return [(field, start) for field, (_, start) in zip(fields, tokens)]
+
+
+def to_display_columns(line: str) -> str:
+    """Pads wide characters so that string indices match the console columns winget aligned to."""
+    if line.replace(ELLIPSIS, "").isascii():  # Cut-off names are the usual non-ASCII lines, and the ellipsis is narrow
+        return line
+    return "".join(char + "\0" if unicodedata.east_asian_width(char) in "WF" else char for char in line)
+
+
+def parse_winget_row(line: str, layout: list[tuple[str, int]]) -> dict | None:
+    """Slices a single winget table row into its columns using the header offsets."""
+    line = to_display_columns(line)
+    row = dict.fromkeys(WINGET_COLUMNS, "")
+    for i, (field, start) in enumerate(layout):
+        end = layout[i + 1][1] if i + 1 < len(layout) else None
+        row[field] = line[start:end].replace("\0", "").strip()
+
+    if not row["name"] or not row["id"]:
+        return None  # Skip blank or malformed lines
+
+    row["name"] = row["name"].rstrip(ELLIPSIS).strip()  # Cut-off names are resolved later
+    return row
+
+
+def parse_winget_list(lines):
+    """Parses `winget list` output in a single pass, yielding one dict per table row."""
+    layout = None
+    pending = None  # Rows are held back by one line, since the header is only known after the separator
+
+    for line in lines:
+        line = line.rsplit("\r", 1)[-1].replace(MOJIBAKE_ELLIPSIS, ELLIPSIS)
+
+        if is_separator_line(line):
+            layout = get_column_layout(pending or "")
+            pending = None
+            continue
+
+        if pending is not None and layout:
+            row = parse_winget_row(pending, layout)
+            if row:
+                yield row
+        pending = line
+
+    if pending is not None and layout:
+        row = parse_winget_row(pending, layout)
+        if row:
+            yield row
+
+
+class NameIndex:
+    """Resolves cut-off winget names to full app names. Built once per inventory."""
+
+    def __init__(self, full_names, cutoff=0.6, max_matches=5):
+        self.cutoff = cutoff
+        self.max_matches = max_matches
+
+        # Exact and prefix tiers: sorted unique names, remembering where each first appeared for tie-breaking
+        self.first_seen = {}
+        for position, name in enumerate(full_names):
+            self.first_seen.setdefault(name, position)
+        self.sorted_names = sorted(self.first_seen)
+
+        # Fuzzy tier: names bucketed by length (duplicates kept, since difflib counts them too)
+        self.names_by_length = {}
+        for name in full_names:
+            self.names_by_length.setdefault(len(name), []).append(name)
+        self.fuzzy_cache = {}
+
+    def resolve(self, raw_name, used_names):
+        """Tries matching the best full name possible from a cut-off name."""
+        raw_name = raw_name.strip()
+
+        # Tier 1: Exact match
+        if raw_name in self.first_seen and raw_name not in used_names:
+            return raw_name
+
+        # Tier 2: Startswith match (prefer longest, unused)
+        best = None
+        for name in self.prefix_matches(raw_name):
+            if name not in used_names and (best is None or (len(name), -self.first_seen[name]) >
+                                           (len(best), -self.first_seen[best])):
+                best = name
+        if best is not None:
+            return best
+
+        # Tier 3: Fuzzy match — ensure uniqueness
+        for match in self.close_matches(raw_name):
+            if match not in used_names:
+                return match
+
+        # Fallback
+        return raw_name
+
+    def prefix_matches(self, prefix):
+        """Yields every known name starting with the prefix, using binary search on the sorted names."""
+        for i in range(bisect.bisect_left(self.sorted_names, prefix), len(self.sorted_names)):
+            name = self.sorted_names[i]
+            if not name.startswith(prefix):
+                break
+            yield name
+
+    def close_matches(self, word):
+        """Same result as difflib.get_close_matches over all names, skipping lengths that can never match."""
+        if word in self.fuzzy_cache:
+            return self.fuzzy_cache[word]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        results = []
+        for length, names in self.names_by_length.items():
+            # Equal to SequenceMatcher.real_quick_ratio() for every name of this length
+            total = length + len(word)
+            if (2.0 * min(length, len(word)) / total if total else 1.0) < self.cutoff:
+                continue
+
+            for name in names:
+                matcher.set_seq1(name)
+                if matcher.quick_ratio() >= self.cutoff and matcher.ratio() >= self.cutoff:
+                    results.append((matcher.ratio(), name))
+
+        matches = [name for _, name in heapq.nlargest(self.max_matches, results)]
+        self.fuzzy_cache[word] = matches
+        return matches
+
+
+def build_inventory_queries(sources=()) -> dict[str, functools.partial]:
+    """Builds the queries for the inventory, optionally with a separate winget query per source."""
+    # Full app names (winget cuts them off) and the name, id, version, availability, and source table
+    queries = {"names": functools.partial(run_powershell_query, "Get-WinGetPackage | Select-Object -ExpandProperty Name")}
+    if sources:
+        for source in sources:
+            queries[f"winget:{source}"] = functools.partial(
+                run_query, ["winget", "list", "--source", source, "--accept-source-agreements"], "utf-8")
+    else:
+        queries["winget"] = functools.partial(run_query, ["winget", "list", "--accept-source-agreements"], "utf-8")
+    return queries
+
+
+def run_query(args, encoding=None) -> dict:
+    """Runs a single inventory command, returning its output, exit code and duration."""
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(
+            args,
+            capture_output=True,
+            text=True,
+            encoding=encoding,
+            errors="replace",
+            shell=False,
+            creationflags=CREATE_NO_WINDOW
+        )
+        stdout, returncode = result.stdout, result.returncode
+    except OSError as e:
+        logging.warning(f"Could not run {args[0]}: {e}")
+        stdout, returncode = "", -1
+    tracing.add_span(args[0], "process", start, time.perf_counter(), command=subprocess.list2cmdline(args),
+                     exit_code=returncode, output_chars=len(stdout))
+    return {"stdout": stdout, "returncode": returncode, "seconds": time.perf_counter() - start}
+
+
+def run_powershell_query(script) -> dict:
+    """Runs a PowerShell script in the shared PowerShell host, returning the same result as run_query."""
+    start = time.perf_counter()
+    try:
+        stdout, returncode = powershell_host.get_host().run(script), 0
+    except (powershell_host.PowerShellHostError, OSError) as e:
+        logging.warning(f"PowerShell query failed: {e}")
+        stdout, returncode = "", 1
+    return {"stdout": stdout, "returncode": returncode, "seconds": time.perf_counter() - start}
+
+
+def run_queries(queries) -> dict[str, dict]:
+    """Launches all inventory queries at the same time and waits for every one of them."""
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        futures = {key: pool.submit(query) for key, query in queries.items()}
+        results = {key: future.result() for key, future in futures.items()}
+
+    for key, result in results.items():
+        logging.info(f"Inventory query '{key}' took {result['seconds']:.2f}s (exit code {result['returncode']})")
+    return results
+
+
+def collect_inventory(sources=()) -> list[AppRecord]:
+    """Gets the installed applications from winget, resolving cut-off names to their full names."""
+    return list(iter_inventory(sources))
+
+
+def iter_inventory(sources=()):
+    """Yields every installed application, preferring structured data over scraping the winget table."""
+    apps = collect_structured_inventory(sources)
+    if apps is not None:
+        yield from apps
+        return
+
+    logging.info("Structured inventory unavailable, falling back to parsing winget list output.")
+    yield from iter_scraped_inventory(sources)
+
+
+def make_app(name, app_id, version, available, source) -> AppRecord:
+    """Builds an app entry. In case of the ID being malformed, the app is shown in app list but all data is removed."""
+    if not re.match(r"^[\w\.\-\+]+$", app_id):
+        return AppRecord(name, app_id)
+    return AppRecord(name, app_id, version or "Unknown", available, source)
+
+
+def collect_structured_inventory(sources=()) -> list[AppRecord] | None:
+    """Gets the installed applications as JSON from the WinGet PowerShell module. Returns None if that fails."""
+    result = run_powershell_query(STRUCTURED_INVENTORY_SCRIPT)
+    logging.info(f"Inventory query 'structured' took {result['seconds']:.2f}s (exit code {result['returncode']})")
+    if result["returncode"] != 0:
+        return None
+    return parse_structured_inventory(result["stdout"], sources)
+
+
+def parse_structured_inventory(text, sources=()) -> list[AppRecord] | None:
+    """Parses the JSON package list, returning None if it is not valid."""
+    try:
+        packages = json.loads(text) if text.strip() else []
+    except json.JSONDecodeError:
+        return None
+    if isinstance(packages, dict):  # ConvertTo-Json does not wrap a single package in a list
+        packages = [packages]
+    if not isinstance(packages, list):
+        return None
+
+    apps = []
+    for package in packages:
+        if not isinstance(package, dict) or not package.get("Id"):
+            continue
+        source = package.get("Source") or ""
+        if sources and source not in sources:
+            continue
+        apps.append(make_app(str(package.get("Name") or package["Id"]), str(package["Id"]),
+                             str(package.get("Version") or ""), str(package.get("Available") or ""), str(source)))
+    return apps
+
+
+def iter_scraped_inventory(sources=()):
+    """Runs the text inventory queries, then yields every installed application as soon as its row is parsed."""
+    results = run_queries(build_inventory_queries(sources))
+    names = results.pop("names")
+    if any(result["returncode"] != 0 for result in results.values()):
+        return
+
+    # The full names come from the PowerShell module too, without it winget's cut-off names are kept
+    full_names = names["stdout"].splitlines() if names["returncode"] == 0 else None
+    yield from parse_scraped_inventory([result["stdout"] for result in results.values()], full_names)
+
+
+def parse_scraped_inventory(outputs, full_names=None):
+    """Parses winget list tables, merging them if there are several, and resolves cut-off names to full ones."""
+    name_index = None
+    if full_names is not None:
+        name_index = NameIndex([line.strip() for line in full_names if line.strip()])
+
+    used_names = set()
+    seen_ids = set()
+    for output in outputs:
+        for row in parse_winget_list(output.splitlines()):
+            if row["id"] in seen_ids:
+                continue
+            seen_ids.add(row["id"])
+
+            if name_index is None:
+                yield make_app(row["name"], row["id"], row["version"], row["available"], row["source"])
+                continue
+            resolved_name = name_index.resolve(row["name"], used_names)
+            used_names.add(resolved_name)
+
+            yield make_app(resolved_name, row["id"], row["version"], row["available"], row["source"])
+
+
+def get_inventory_fingerprint(apps) -> str:
+    """Hashes an app list, so that two inventories can be compared without diffing them."""
+    rows = sorted((app.id, app.name, app.version, app.available, app.source) for app in apps)
+    return hashlib.sha1(json.dumps(rows).encode("utf-8")).hexdigest()
+
+
+def load_cached_inventory() -> dict | None:
+    """Loads the last collected app list, along with when it was collected and its fingerprint."""
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or not isinstance(cache.get("apps"), list):
+        return None
+    cache["apps"] = [AppRecord.from_dict(app) for app in cache["apps"] if isinstance(app, dict)]
+    return cache
+
+
+def save_cached_inventory(apps):
+    """Saves an app list to the inventory cache in AppData."""
+    settings.write_json_atomic(CACHE_FILE, {
+        "version": CACHE_VERSION,
+        "timestamp": time.time(),
+        "fingerprint": get_inventory_fingerprint(apps),
+        "apps": [app.to_dict() for app in apps]
+    })
+
+
+def is_cache_fresh(cache, ttl) -> bool:
+    """Checks whether a cached inventory is younger than the given time-to-live in seconds."""
+    return cache is not None and 0 <= time.time() - cache.get("timestamp", 0) < ttl
+
+
+def refresh_inventory(sources=()) -> list[AppRecord]:
+    """Collects the inventory and updates the cache. A failed collection leaves the cache untouched."""
+    apps = collect_inventory(sources)
+    if apps:
+        save_cached_inventory(apps)
+    return apps
+
+
+def get_update_list(apps_list, exclusions):
+    """The apps with an available update that are not excluded."""
+    apps = []
+    for app in apps_list:
+        if app.available != "" and app not in exclusions:
+            apps.append(app)
+
+    return apps
+
+
+def diff_inventory(old_apps, new_apps) -> tuple[list[AppRecord], list[AppRecord], list[AppRecord]]:
+    """Compares two app lists by id, returning the added, removed and changed apps (changed ones as in new_apps)."""
+    old_by_id = {app.id: app for app in old_apps}
+    new_by_id = {app.id: app for app in new_apps}
+
+    added = [app for app_id, app in new_by_id.items() if app_id not in old_by_id]
+    removed = [app for app_id, app in old_by_id.items() if app_id not in new_by_id]
+    changed = [app for app_id, app in new_by_id.items() if app_id in old_by_id and old_by_id[app_id] != app]
+    return added, removed, changed
+
+
+if __name__ == "__main__":
+    # Benchmarks on synthetic inventories, against the code each part of this module replaced
+    import random
+    import timeit
+    import tracemalloc
+
+    WORDS = ("Microsoft", "Visual", "Studio", "Code", "Runtime", "Redistributable", "Google", "Chrome", "Mozilla",
+             "Firefox", "Adobe", "Acrobat", "Reader", "Python", "Launcher", "Git", "Node.js", "Update", "Helper",
+             "NVIDIA", "Graphics", "Driver", "PowerToys", "Terminal", "Steam", "Discord", "Zoom", "Spotify", "7-Zip")
+
+    def fake_rows(count, seed=1):
+        """Random (name, id, version, available, source) rows, some with names long enough to be cut off."""
+        rng = random.Random(seed)
+        rows = []
+        for i in range(count):
+            words = rng.sample(WORDS, rng.randint(1, 5))
+            name = " ".join(words) + f" {i}"
+            version = ".".join(str(rng.randint(0, 120)) for _ in range(rng.randint(1, 4)))
+            available = f"{version}.1" if rng.random() < 0.3 else ""
+            rows.append((name, f"{words[0].replace(' ', '')}.App{i}", version, available, "winget"))
+        return rows
+
+    def fake_winget_list(rows, name_width=40):
+        """Lays rows out like winget list does, cutting off long names with an ellipsis."""
+        widths = (name_width, max(len(row[1]) for row in rows) + 1, 18, 18, 6)
+        header = "".join(text.ljust(width) for text, width in zip(WINGET_HEADERS, widths)).rstrip()
+        lines = ["   - \r  \\ \r", header, "-" * len(header)]
+        for name, *rest in rows:
+            name = name if len(name) < name_width else name[:name_width - 2] + ELLIPSIS
+            lines.append("".join(text.ljust(width) for text, width in zip((name, *rest), widths)).rstrip())
+        return lines
+
+    def parse_with_regex(lines):
+        """The parser replaced in 1.x: a regex and a split on runs of spaces for every line after the first 8."""
+        apps = []
+        for line in [line.strip().replace(MOJIBAKE_ELLIPSIS, "   ") for line in lines[8:] if line.strip()]:
+            match = re.match(r"^(?P<name>.+?)\s{2,}(?P<id>\S+)\s{2,}(?P<version>\S+|Unknown)"
+                             r"(?:\s{2,}(?P<available>\S+))?(?:\s{2,}(?P<source>\S+))?$", line.strip())
+            if match:
+                parts = re.split(r"\s{2,}", line)
+                if len(parts) < 3:
+                    continue
+                available = source = ""
+                if len(parts) >= 5:
+                    available, source = parts[3], parts[4]
+                elif len(parts) == 4:
+                    if re.match(r"^\d+(\.\d+)*$", parts[3]):
+                        available = parts[3]
+                    else:
+                        source = parts[3]
+                apps.append({"name": parts[0], "id": parts[1], "version": parts[2], "available": available,
+                             "source": source})
+        return apps
+
+    # Parsing a 10k row winget list table
+    rows = fake_rows(10_000)
+    lines = fake_winget_list(rows)
+    parsed = list(parse_winget_list(lines))
+    assert [(row["id"], row["version"], row["available"]) for row in parsed] == [row[1:4] for row in rows]
+    old = timeit.timeit(lambda: parse_with_regex(lines), number=5) / 5
+    new = timeit.timeit(lambda: list(parse_winget_list(lines)), number=5) / 5
+    regex_correct = {(app["id"], app["version"], app["available"]) for app in parse_with_regex(lines)}
+    print(f"Parsing {len(rows)} rows: regex {old * 1000:.1f}ms ({len(regex_correct & {row[1:4] for row in rows})} "
+          f"rows right), column offsets {new * 1000:.1f}ms ({len(parsed)} rows right), {old / new:.1f}x faster")
+
+    def measure_memory(make):
+        """Bytes still allocated by what make() returns, including the strings parsed for it."""
+        tracemalloc.start()
+        kept = make()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size
+
+    # Memory of the same 10k parsed apps kept as five-key dicts and as AppRecords
+    dicts = measure_memory(lambda: list(parse_winget_list(lines)))
+    records = measure_memory(lambda: [AppRecord(**row) for row in parse_winget_list(lines)])
+    print(f"Keeping {len(rows)} apps: dicts {dicts / 1e6:.1f}MB, AppRecords {records / 1e6:.1f}MB "
+          f"({1 - records / dicts:.0%} less)")
+
+    def get_best_full_name(raw_name, full_names, used_names):
+        """The name matching replaced by NameIndex, scanning every full name for every row."""
+        raw_name = raw_name.strip()
+        if raw_name in full_names and raw_name not in used_names:
+            return raw_name
+        startswith_matches = [name for name in full_names if name.startswith(raw_name) and name not in used_names]
+        if startswith_matches:
+            return max(startswith_matches, key=lambda name: len(name))
+        for match in difflib.get_close_matches(raw_name, full_names, n=5, cutoff=0.6):
+            if match not in used_names:
+                return match
+        return raw_name
+
+    def resolve_all(raw_names, resolve):
+        """Resolves the winget names of an inventory in order, like iter_scraped_inventory does."""
+        used_names = set()
+        resolved = []
+        for raw_name in raw_names:
+            name = resolve(raw_name, used_names)
+            used_names.add(name)
+            resolved.append(name)
+        return resolved
+
+    def fake_names(count, rng, unmatched=0.15, cut_anywhere=0.35):
+        """Full names and the names winget shows for them: cut off, or a share spelled differently or unknown."""
+        full_names = [row[0] for row in fake_rows(count, rng.random())]
+        raw_names = []
+        for name in full_names:
+            roll = rng.random()
+            if roll < unmatched * 2 / 3:
+                raw_names.append(name.replace(" ", "", 1)[:30])  # Spelled differently
+            elif roll < unmatched:
+                raw_names.append(f"Unknown App {rng.randint(0, count)}")
+            elif roll < unmatched + cut_anywhere:
+                raw_names.append(name[:rng.randint(3, max(3, len(name) - 1))])  # Cut off anywhere
+            else:
+                raw_names.append(name[:30])  # Cut off by winget's column width
+        rng.shuffle(raw_names)
+        full_names += rng.sample(full_names, count // 10)  # Apps installed twice
+        return full_names, raw_names
+
+    # Name resolution gives the same names as the old matching on random inventories, many needing fuzzy matching
+    rng = random.Random(2)
+    mismatches = 0
+    for _ in range(300):
+        full_names, raw_names = fake_names(rng.randint(0, 60), rng)
+        mismatches += resolve_all(raw_names, NameIndex(full_names).resolve) != resolve_all(
+            raw_names, lambda raw_name, used_names: get_best_full_name(raw_name, full_names, used_names))
+    print(f"Name resolution on 300 random inventories: {mismatches} differ from the old matching")
+
+    # The index speeds up exact and cut-off names, names that need fuzzy matching still compare against every name
+    for unmatched in (0.0, 0.02):
+        for count in (100, 1_000, 10_000):
+            full_names, raw_names = fake_names(count, random.Random(count), unmatched, cut_anywhere=0)
+            started = time.perf_counter()
+            resolve_all(raw_names, NameIndex(full_names).resolve)
+            new = time.perf_counter() - started
+            sample = raw_names[:min(count, 1_000)]  # The old matching takes long on all 10k names
+            started = time.perf_counter()
+            resolve_all(sample, lambda raw_name, used_names: get_best_full_name(raw_name, full_names, used_names))
+            old = (time.perf_counter() - started) * count / len(sample)
+            print(f"Resolving {count:5d} names, {unmatched:3.0%} unmatched: old matching {old:7.2f}s"
+                  f"{'' if len(sample) == count else ' (estimated)'}, name index {new:6.2f}s ({old / new:.0f}x)")
+
+    # Structured JSON against scraping the winget table, on sample output of the same inventory in winget's format
+    fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    with open(os.path.join(fixtures, "winget_list.txt"), encoding="utf-8") as f:
+        winget_list = f.read()
+    with open(os.path.join(fixtures, "winget_packages.json"), encoding="utf-8") as f:
+        packages_json = f.read()
+    full_names = [package["Name"] for package in json.loads(packages_json)]  # What the names query returns
+
+    structured = parse_structured_inventory(packages_json)
+    scraped = list(parse_scraped_inventory([winget_list], full_names))
+    assert sorted(structured, key=lambda app: app.id) == sorted(scraped, key=lambda app: app.id)
+    calls = 2_000
+    text = timeit.timeit(lambda: list(parse_scraped_inventory([winget_list], full_names)), number=calls) / calls
+    structured_time = timeit.timeit(lambda: parse_structured_inventory(packages_json), number=calls) / calls
+    print(f"Parsing the sample inventory of {len(structured)} apps: scraped text {text * 1e6:.0f}us, "
+          f"JSON {structured_time * 1e6:.0f}us ({text / structured_time:.1f}x), same apps from both")
@@ -0,0 +1,89 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import threading
+
+
+class LoopThread:
+    """A single long-lived asyncio loop in its own thread, which runs all of the app's background work."""
+
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Starts the loop thread, unless it is already running."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        """Runs the loop until stop() is called, then closes it."""
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedules a coroutine on the loop from any thread, starting the loop on first use."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Calls a function on the loop thread from any thread."""
+        self.start()
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    async def cancel_all(self):
+        """Cancels every task on the loop and waits for them to clean up, like killing their winget calls."""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.loop.shutdown_asyncgens()
+
+    def stop(self, timeout=10):
+        """Cancels the running work and stops the loop thread. Called when the app exits."""
+        with self.lock:
+            if self.thread is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self.cancel_all(), self.loop).result(timeout)
+            except (concurrent.futures.TimeoutError, RuntimeError) as e:
+                logging.warning(f"Background tasks did not stop in time: {e!r}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+            self.thread = None
+
+
+_loop_thread = None
+_loop_thread_lock = threading.Lock()
+
+
+def get_loop_thread() -> LoopThread:
+    """Returns the session's shared loop thread."""
+    global _loop_thread
+    with _loop_thread_lock:
+        if _loop_thread is None:
+            _loop_thread = LoopThread()
+            atexit.register(shutdown_loop_thread)
+        return _loop_thread
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """Runs a coroutine on the shared loop thread, returning a future that can be waited on from any thread."""
+    return get_loop_thread().submit(coro)
+
+
+def shutdown_loop_thread():
+    """Stops the shared loop thread, if it was started."""
+    with _loop_thread_lock:
+        if _loop_thread is not None:
+            _loop_thread.stop()
@@ -0,0 +1,266 @@
+import atexit
+import base64
+import itertools
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+import tracing
+
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Only defined on Windows
+IDLE_CHECK_AFTER = 300  # Seconds a host may sit idle before it is pinged ahead of the next request
+PING_TIMEOUT = 30
+
+# Reads one JSON request per line from stdin, runs its script and writes one JSON response line to stdout
+HOST_SCRIPT = r'''
+$ProgressPreference = 'SilentlyContinue'
+[Console]::InputEncoding = [System.Text.Encoding]::UTF8
+[Console]::OutputEncoding = [System.Text.Encoding]::UTF8
+
+while ($true) {
+    $line = [Console]::In.ReadLine()
+    if ($null -eq $line) { break }
+    if (-not $line.Trim()) { continue }
+
+    $request = $line | ConvertFrom-Json
+    try {
+        $output = (& ([ScriptBlock]::Create($request.script)) | ForEach-Object { "$_" }) -join "`n"
+        $response = @{ id = $request.id; ok = $true; output = $output; error = '' }
+    } catch {
+        $response = @{ id = $request.id; ok = $false; output = ''; error = $_.Exception.Message }
+    }
+
+    [Console]::Out.WriteLine(($response | ConvertTo-Json -Compress))
+    [Console]::Out.Flush()
+}
+'''
+
+
+class PowerShellHostError(Exception):
+    pass
+
+
+class PowerShellHost:
+    """A single long-lived PowerShell process that runs every script of the session, so modules are imported once."""
+
+    def __init__(self, command=None, timeout=300, max_restarts=3, idle_check_after=IDLE_CHECK_AFTER):
+        encoded_script = base64.b64encode(HOST_SCRIPT.encode("utf-16-le")).decode("ascii")
+        self.command = command or ["powershell", "-NoProfile", "-NoLogo", "-ExecutionPolicy", "Bypass",
+                                   "-EncodedCommand", encoded_script]
+        self.timeout = timeout  # Seconds a single script may run before the host is considered hung
+        self.max_restarts = max_restarts  # Consecutive crashes tolerated before giving up
+        self.idle_check_after = idle_check_after
+        self.last_used = 0.0  # When the last response arrived
+        self.restarts = 0
+        self.process = None
+        self.responses = None
+        self.request_ids = itertools.count(1)
+        self.lock = threading.Lock()  # One request at a time, since responses arrive in order
+
+    def start(self):
+        """Starts the PowerShell process along with the threads draining its output."""
+        start = time.perf_counter()
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="replace",
+            shell=False,
+            creationflags=CREATE_NO_WINDOW
+        )
+        self.responses = queue.Queue()
+        threading.Thread(target=self.read_stdout, args=(self.process, self.responses), daemon=True).start()
+        threading.Thread(target=self.read_stderr, args=(self.process,), daemon=True).start()
+        logging.info(f"Started PowerShell host (pid {self.process.pid})")
+        tracing.add_span("PowerShell host", "spawn", start, time.perf_counter(), pid=self.process.pid)
+
+    @staticmethod
+    def read_stdout(process, responses):
+        """Forwards every response line to the queue, followed by None once the process exits."""
+        for line in process.stdout:
+            responses.put(line)
+        responses.put(None)
+
+    @staticmethod
+    def read_stderr(process):
+        """Logs anything the host writes to stderr, so the pipe never fills up."""
+        for line in process.stderr:
+            logging.debug(f"PowerShell host: {line.rstrip()}")
+
+    def is_running(self) -> bool:
+        """Checks whether the host process is alive."""
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, script: str, timeout=None) -> str:
+        """Runs a PowerShell script in the host and returns its output. Restarts the host if it has crashed."""
+        with self.lock:
+            # A host left alone for long may have hung, which would only show once this request times out
+            if self.is_running() and time.monotonic() - self.last_used > self.idle_check_after and not self.ping():
+                logging.warning("PowerShell host stopped answering while idle, restarting it")
+                self.kill()
+                self.process = None  # Started fresh below, without counting as a crash
+
+            while True:
+                if not self.is_running():
+                    if self.process is not None:
+                        if self.restarts >= self.max_restarts:
+                            self.process = None  # Give up on this request, the next one starts from scratch
+                            self.restarts = 0
+                            raise PowerShellHostError("The PowerShell host keeps crashing.")
+                        self.restarts += 1
+                        logging.warning(f"PowerShell host exited with code {self.process.returncode}, restarting "
+                                        f"({self.restarts}/{self.max_restarts})")
+                    self.start()
+
+                with tracing.span("PowerShell", "powershell", pid=self.process.pid) as span:
+                    try:
+                        response = self.send(script, timeout or self.timeout)
+                    except (BrokenPipeError, EOFError):
+                        span.set(error="crashed")
+                        continue  # Crashed mid-request, restart and try again
+                    span.set(ok=bool(response.get("ok")), output_chars=len(response.get("output") or ""))
+
+                self.restarts = 0
+                self.last_used = time.monotonic()
+                if not response.get("ok"):
+                    raise PowerShellHostError(response.get("error") or "Unknown PowerShell error.")
+                return response.get("output") or ""
+
+    def send(self, script: str, timeout) -> dict:
+        """Writes a single request and waits for its response."""
+        request_id = next(self.request_ids)
+        self.process.stdin.write(json.dumps({"id": request_id, "script": script}) + "\n")
+        self.process.stdin.flush()
+
+        while True:
+            try:
+                line = self.responses.get(timeout=timeout)
+            except queue.Empty:
+                self.kill()
+                raise PowerShellHostError(f"PowerShell did not respond within {timeout} seconds.")
+            if line is None:
+                self.process.wait()
+                raise EOFError
+
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                logging.debug(f"PowerShell host: {line.rstrip()}")  # Stray console output from a script
+                continue
+            if isinstance(response, dict) and response.get("id") == request_id:
+                return response
+
+    def ping(self, timeout=PING_TIMEOUT) -> bool:
+        """Health check: whether the host answers a trivial request. Called by run() with the lock held."""
+        try:
+            return (self.send("Write-Output 'pong'", timeout).get("output") or "").strip() == "pong"
+        except (PowerShellHostError, OSError, EOFError):
+            return False
+
+    def kill(self):
+        """Kills the host process without waiting for it to finish its current request."""
+        if self.is_running():
+            self.process.kill()
+            self.process.wait()
+
+    def close(self):
+        """Shuts the host down by closing its input, killing it if it does not exit."""
+        if not self.is_running():
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+        logging.info("Stopped PowerShell host")
+
+
+_host = None
+_host_lock = threading.Lock()
+
+
+def get_host() -> PowerShellHost:
+    """Returns the session's shared PowerShell host, starting it on first use."""
+    global _host
+    with _host_lock:
+        if _host is None:
+            _host = PowerShellHost()
+            atexit.register(shutdown_host)
+        return _host
+
+
+def shutdown_host():
+    """Stops the shared PowerShell host, if it was started."""
+    with _host_lock:
+        if _host is not None:
+            _host.close()
+
+
+if __name__ == "__main__":
+    import os
+    import re
+    import signal
+    import sys
+
+    if sys.argv[1:] == ["--stand-in"]:
+        # Python stand-in for HOST_SCRIPT, speaking the same protocol without PowerShell:
+        # Write-Output 'text' answers text, Write-Host 'text' prints a stray line, throw 'text' fails,
+        # Start-Sleep n hangs for n seconds and exit crashes the host
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            script = request["script"]
+            response = {"id": request["id"], "ok": True, "output": "", "error": ""}
+            for command, argument in re.findall(r"([\w-]+)\s*'?([^';]*)'?", script):
+                if command == "Write-Output":
+                    response["output"] += argument
+                elif command == "Write-Host":
+                    print(argument, flush=True)
+                elif command == "throw":
+                    response.update(ok=False, error=argument)
+                elif command == "Start-Sleep":
+                    time.sleep(float(argument))
+                elif command == "exit":
+                    sys.exit(1)
+            print(json.dumps(response), flush=True)
+        sys.exit(0)
+
+    # Exercises the host against the stand-in: answers, failures, crashes, hangs and a host that hangs while idle
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    host = PowerShellHost(command=[sys.executable, os.path.abspath(__file__), "--stand-in"], timeout=2)
+    failures = 0
+
+    def check(label, script, expected):
+        global failures
+        started = time.perf_counter()
+        try:
+            result = host.run(script)
+        except PowerShellHostError as e:
+            result = PowerShellHostError
+            logging.info(f"{label}: {e}")
+        print(f"{'ok  ' if result == expected else 'FAIL'} {label} ({(time.perf_counter() - started) * 1000:.0f}ms)")
+        failures += result != expected
+
+    check("answers", "Write-Output 'hello'", "hello")
+    check("skips stray output", "Write-Host 'noise'; Write-Output 'after'", "after")
+    check("reports a failed script", "throw 'broken'", PowerShellHostError)
+    check("gives up on a script that always crashes the host", "exit", PowerShellHostError)
+    check("starts again after giving up", "Write-Output 'back'", "back")
+    check("times out a hung script", "Start-Sleep 10", PowerShellHostError)
+    check("restarts after a hang", "Write-Output 'restarted'", "restarted")
+    started = time.perf_counter()
+    for _ in range(100):
+        host.run("Write-Output 'x'")
+    print(f"100 requests took {(time.perf_counter() - started) * 1000:.0f}ms")
+    if hasattr(signal, "SIGSTOP"):
+        host.idle_check_after = 0
+        host.ping = lambda timeout=1: PowerShellHost.ping(host, timeout)  # Keeps the check short
+        os.kill(host.process.pid, signal.SIGSTOP)  # Hangs while idle
+        check("pings an idle host and replaces it when it hangs", "Write-Output 'fresh'", "fresh")
+    host.close()
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,155 @@
+import asyncio
+import codecs
+import ctypes
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+import tracing
+
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Only defined on Windows
+READ_SIZE = 4096
+POLL_INTERVAL = 1.0  # Seconds between timeout checks
+DRAIN_TIMEOUT = 5.0  # Seconds to wait for the rest of the output once the process has exited
+
+# Reasons a process was ended before it exited by itself
+TIMED_OUT = "timed_out"
+STALLED = "stalled"  # No output for too long
+CANCELLED = "cancelled"
+
+# Spinners redraw themselves forever, even while the installer behind them hangs
+SPINNER_ONLY = re.compile(r"^[\s\-\\|/\x08]*$")
+
+
+@dataclass
+class ProcessResult:
+    """What a finished or killed process returned."""
+    returncode: int | None
+    stdout: str
+    stderr: str
+    seconds: float
+    ended_by: str | None = None  # TIMED_OUT, STALLED or CANCELLED if the process was killed
+
+
+def get_console_encoding() -> str:
+    """The codec of the console code page that console programs like winget write their output in."""
+    if sys.platform == "win32":
+        code_page = ctypes.windll.kernel32.GetConsoleOutputCP()  # 0 when the app runs without a console
+        if code_page and code_page != 65001:
+            try:
+                return codecs.lookup(f"cp{code_page}").name
+            except LookupError:
+                pass
+    return "utf-8"
+
+
+async def kill_process_tree(process):
+    """Kills a process along with every process it started, such as the installer winget is waiting on."""
+    if process.returncode is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            killer = await asyncio.create_subprocess_exec(
+                "taskkill", "/T", "/F", "/PID", str(process.pid),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=CREATE_NO_WINDOW
+            )
+            await killer.wait()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)  # Started in its own session, see run_process
+    except (OSError, ProcessLookupError) as e:
+        logging.warning(f"Could not kill the process tree of {process.pid}: {e}")
+
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+async def run_process(args, timeout=None, stall_timeout=None, cancel_event=None, merge_stderr=False,
+                      on_output=None, encoding=None) -> ProcessResult:
+    """Runs a command and streams its output, killing its process tree on a timeout, a stall or cancel_event."""
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+        creationflags=CREATE_NO_WINDOW,
+        start_new_session=sys.platform != "win32"
+    )
+    spawned = time.perf_counter()
+
+    stdout, stderr = [], []
+    output_bytes = 0
+    last_output = time.perf_counter()
+
+    # on_output is awaited with every decoded chunk of stdout as it arrives
+    async def read_stream(stream, chunks, callback):
+        nonlocal last_output, output_bytes
+        decoder = codecs.getincrementaldecoder(encoding or get_console_encoding())(errors="replace")
+        while True:
+            data = await stream.read(READ_SIZE)
+            output_bytes += len(data)
+            text = decoder.decode(data, final=not data)  # Keeps characters split across reads together
+            if text:
+                chunks.append(text)
+                if not SPINNER_ONLY.match(text):
+                    last_output = time.perf_counter()
+                if callback:
+                    await callback(text)
+            if not data:
+                break
+
+    readers = [asyncio.create_task(read_stream(process.stdout, stdout, on_output))]
+    if not merge_stderr:
+        readers.append(asyncio.create_task(read_stream(process.stderr, stderr, None)))
+    exited = asyncio.ensure_future(process.wait())
+    cancelled = asyncio.ensure_future(cancel_event.wait()) if cancel_event else None
+
+    ended_by = None
+    try:
+        while not exited.done():
+            await asyncio.wait({exited, cancelled} - {None}, timeout=POLL_INTERVAL,
+                               return_when=asyncio.FIRST_COMPLETED)
+            now = time.perf_counter()
+            if exited.done():
+                break
+            if cancel_event and cancel_event.is_set():
+                ended_by = CANCELLED
+            elif timeout and now - start > timeout:
+                ended_by = TIMED_OUT
+            elif stall_timeout and now - last_output > stall_timeout:
+                ended_by = STALLED
+            if ended_by:
+                logging.warning(f"Killing {subprocess.list2cmdline(args)} ({ended_by} after {now - start:.0f}s)")
+                await kill_process_tree(process)
+                break
+
+        # Drain what is left in the pipes, unless a process outside the tree still holds them open
+        await asyncio.wait_for(asyncio.gather(*readers), DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.warning(f"Output of {subprocess.list2cmdline(args)} did not close after it exited")
+    except asyncio.CancelledError:
+        await kill_process_tree(process)
+        raise
+    finally:
+        exited.cancel()
+        if cancelled:
+            cancelled.cancel()
+        for reader in readers:
+            reader.cancel()
+        if tracing.is_enabled():
+            tracing.add_span(os.path.basename(args[0]), "process", start, time.perf_counter(),
+                             command=subprocess.list2cmdline(args), pid=process.pid,
+                             spawn_seconds=spawned - start, exit_code=process.returncode,
+                             output_bytes=output_bytes, ended_by=ended_by)
+
+    return ProcessResult(process.returncode, "".join(stdout), "".join(stderr), time.perf_counter() - start,
+                         ended_by)
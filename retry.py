@@ -0,0 +1,81 @@
+import random
+import re
+
+# Retry limits
+MAX_RETRIES = 3  # Retries of a single app in one run
+RUN_RETRY_BUDGET = 20  # Retries of all apps together in one run, so a problem with the whole machine ends the run
+BASE_DELAY = 20.0  # Seconds before the first retry of an app, doubled for every further one
+MAX_DELAY = 300.0
+
+# Exit codes of winget and of the installers it runs, signed codes are normalized to unsigned 32-bit values
+TERMINAL_EXIT_CODES = {
+    1602: "cancelled by the user",  # ERROR_INSTALL_USEREXIT
+    0x8A150104: "a dependency is missing",  # APPINSTALLER_CLI_ERROR_INSTALL_MISSING_DEPENDENCY
+    0x8A150105: "the disk is full",  # APPINSTALLER_CLI_ERROR_INSTALL_DISK_FULL
+    0x8A15010C: "cancelled by the user",  # APPINSTALLER_CLI_ERROR_INSTALL_CANCELLED_BY_USER
+    0x8A15010F: "blocked by policy",  # APPINSTALLER_CLI_ERROR_INSTALL_BLOCKED_BY_POLICY
+}
+TRANSIENT_EXIT_CODES = {
+    1618: "another installation is in progress",  # ERROR_INSTALL_ALREADY_RUNNING, held by the Windows Installer mutex
+    0x8A150008: "the download failed",  # APPINSTALLER_CLI_ERROR_DOWNLOAD_FAILED
+    0x8A150101: "the app is running",  # APPINSTALLER_CLI_ERROR_INSTALL_PACKAGE_IN_USE
+    0x8A150102: "another installation is in progress",  # APPINSTALLER_CLI_ERROR_INSTALL_INSTALL_IN_PROGRESS
+    0x8A150103: "a file is in use",  # APPINSTALLER_CLI_ERROR_INSTALL_FILE_IN_USE
+    0x8A150107: "no network connection",  # APPINSTALLER_CLI_ERROR_INSTALL_NO_NETWORK
+}
+
+# Output of failures that may pass, matched in lower case
+TRANSIENT_PATTERNS = {
+    "another installation is already in progress": "another installation is in progress",
+    "being used by another process": "a file is in use",
+    "files are in use": "a file is in use",
+    "file is in use": "a file is in use",
+    "application is currently running": "the app is running",
+    "download failed": "the download failed",
+}
+
+# e.g. "Installer failed with exit code: 1618"
+INSTALLER_EXIT_CODE = re.compile(r"exit code:?\s*(0x[0-9a-f]+|-?\d+)", re.IGNORECASE)
+
+
+def get_exit_codes(returncode, output) -> list[int]:
+    """The exit codes of a failed winget call, its own and those of the installers it reported."""
+    codes = [returncode] if returncode else []
+    codes += [int(code, 0) for code in INSTALLER_EXIT_CODE.findall(output)]
+    return [code & 0xFFFFFFFF for code in codes]
+
+
+def classify_failure(returncode, output) -> str | None:
+    """The reason a failed winget call may succeed when retried, or None if a retry would fail the same way."""
+    codes = get_exit_codes(returncode, output)
+    if any(code in TERMINAL_EXIT_CODES for code in codes):
+        return None
+
+    for code in codes:
+        if code in TRANSIENT_EXIT_CODES:
+            return TRANSIENT_EXIT_CODES[code]
+
+    output = output.lower()
+    return next((reason for pattern, reason in TRANSIENT_PATTERNS.items() if pattern in output), None)
+
+
+class RetryPolicy:
+    """Hands out the retries of a single run, waiting longer before every retry of the same app."""
+
+    def __init__(self, max_retries=MAX_RETRIES, budget=RUN_RETRY_BUDGET, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.max_retries = max_retries
+        self.budget = budget  # Retries left for the whole run
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = {}  # Retries used so far, keyed by package id or name
+
+    def get_delay(self, key) -> float | None:
+        """Uses up a retry of a package and returns the seconds to wait before it, or None if none are left."""
+        used = self.retries.get(key, 0)
+        if used >= self.max_retries or self.budget <= 0:
+            return None
+
+        self.retries[key] = used + 1
+        self.budget -= 1
+        delay = min(self.max_delay, self.base_delay * 2 ** used)
+        return random.uniform(delay / 2, delay)  # Apps that failed together do not all retry together
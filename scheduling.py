@@ -0,0 +1,200 @@
+import heapq
+import logging
+import sqlite3
+import statistics
+import time
+import history
+
+# Constants
+DURATIONS_KEPT = 5  # Most recent durations kept per package
+DEFAULT_DURATION = 60.0  # Seconds assumed for a package when nothing has been recorded yet
+MIN_CORRECTION, MAX_CORRECTION = 0.25, 4.0  # Bounds of the speed-up or slow-down learned during a run
+
+# Scheduling policies
+LIST_ORDER = "list"  # The order the apps are listed in
+SHORTEST_FIRST = "shortest_first"  # Quick updates finish early instead of queueing behind large ones
+LONGEST_FIRST = "longest_first"  # Large updates start early, so they do not run alone at the end
+POLICIES = (LIST_ORDER, SHORTEST_FIRST, LONGEST_FIRST)
+MAX_REPLAYED = 1000  # Pending apps the ETA replays one by one, longer queues are estimated as a whole
+
+
+class DurationHistory:
+    """The recent update durations of every package, used to estimate how long the next update takes."""
+
+    def __init__(self, durations=None):
+        self.durations = durations or {}  # Recent durations in seconds, keyed by package id or name
+
+    @classmethod
+    def load(cls, store=None) -> "DurationHistory":
+        """Loads the most recent durations of every package from the update history, none if it cannot be read."""
+        try:
+            return cls((store or history.get_store()).recent_durations(DURATIONS_KEPT))
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Could not read the update durations: {e}")
+            return cls()
+
+    @staticmethod
+    def get_key(app) -> str:
+        """Keys an app by its package id, falling back to its name."""
+        return app.id or app.name
+
+    def record(self, app, seconds):
+        """Records how long updating an app took."""
+        recent = self.durations.setdefault(self.get_key(app), [])
+        recent.append(round(seconds, 2))
+        del recent[:-DURATIONS_KEPT]
+
+    def estimate(self, app) -> float | None:
+        """The expected update duration of an app, or None if it was never updated."""
+        return self.estimate_key(self.get_key(app))
+
+    def estimate_key(self, key) -> float | None:
+        """The expected update duration of a package id or name, or None if it was never updated."""
+        recent = self.durations.get(key)
+        return statistics.median(recent) if recent else None
+
+    def estimate_all(self, apps) -> list[float]:
+        """Estimates every app, using the median of the known ones for apps never updated."""
+        return self.estimate_all_keys([self.get_key(app) for app in apps])
+
+    def estimate_all_keys(self, keys) -> list[float]:
+        """Estimates every package id or name, using the median of the known ones for packages never updated."""
+        estimates = [self.estimate_key(key) for key in keys]
+        known = [estimate for estimate in estimates if estimate is not None]
+        fallback = statistics.median(known) if known else DEFAULT_DURATION
+        return [fallback if estimate is None else estimate for estimate in estimates]
+
+
+def order_apps(apps, history, policy=LIST_ORDER):
+    """Orders the update queue by the expected duration of every app. Equal estimates keep their list order."""
+    if policy not in (SHORTEST_FIRST, LONGEST_FIRST):
+        return apps  # A generator stays lazy
+
+    apps = list(apps)
+
+    estimates = history.estimate_all(apps)
+    order = sorted(range(len(apps)), key=lambda i: estimates[i], reverse=policy == LONGEST_FIRST)
+    return [apps[i] for i in order]
+
+
+def simulate_schedule(durations, concurrency) -> tuple[float, float]:
+    """Replays jobs in the given order on a number of workers. Returns the makespan and the mean completion time."""
+    if not durations:
+        return 0.0, 0.0
+
+    workers = [0.0] * max(1, concurrency)  # Time each worker becomes free
+    completions = []
+    for duration in durations:
+        finish = heapq.heappop(workers) + duration
+        completions.append(finish)
+        heapq.heappush(workers, finish)
+    return max(completions), statistics.fmean(completions)
+
+
+class EtaEstimator:
+    """Predicts how long the rest of a run takes, correcting the recorded durations as apps finish."""
+
+    def __init__(self, durations, apps):
+        self.durations = durations
+        self.estimates = {}
+        self.fallback = DEFAULT_DURATION
+        self.pending = {}  # Estimated duration of every app not started yet, in queue order
+        self.pending_total = 0.0
+        self.running = {}  # Start time of every running app
+        self.predicted_done = 0.0  # Estimated durations of the finished apps
+        self.actual_done = 0.0  # Real durations of the finished apps
+        self.add(apps)
+
+    def add(self, apps):
+        """Adds apps queued behind the pending ones."""
+        keys = [self.durations.get_key(app) for app in apps]
+        if self.estimates:
+            # Packages never updated keep the fallback of the first apps, so adding one at a time stays cheap
+            estimates = [self.fallback if estimate is None else estimate
+                         for estimate in map(self.durations.estimate_key, keys)]
+        else:
+            estimates = self.durations.estimate_all_keys(keys)
+            self.fallback = statistics.median(estimates) if estimates else DEFAULT_DURATION
+        self.estimates.update(zip(keys, estimates))
+        for key in keys:
+            if key not in self.pending:
+                self.pending[key] = self.estimates[key]
+                self.pending_total += self.estimates[key]
+
+    def app_started(self, app):
+        """Marks an app as running."""
+        key = DurationHistory.get_key(app)
+        self.pending_total -= self.pending.pop(key, 0.0)
+        self.running.setdefault(key, time.monotonic())
+
+    def app_finished(self, app, seconds):
+        """Marks an app as finished, learning from how long it really took."""
+        key = DurationHistory.get_key(app)
+        self.pending_total -= self.pending.pop(key, 0.0)
+        self.running.pop(key, None)
+        self.predicted_done += self.estimates.get(key, self.fallback)
+        self.actual_done += seconds
+
+    def get_correction(self) -> float:
+        """How much slower (above 1) or faster (below 1) than estimated this run has been so far."""
+        if self.predicted_done <= 0:
+            return 1.0
+        return min(MAX_CORRECTION, max(MIN_CORRECTION, self.actual_done / self.predicted_done))
+
+    def remaining(self, concurrency) -> float:
+        """Seconds until every app is expected to be done, replaying the queue on the free and running workers."""
+        now = time.monotonic()
+        correction = self.get_correction()
+        workers = [max(0.0, self.estimates.get(key, self.fallback) * correction - (now - started))
+                   for key, started in self.running.items()]
+        workers += [0.0] * max(0, max(1, concurrency) - len(workers))  # Free workers start right away
+        if len(self.pending) > MAX_REPLAYED:
+            # A long queue keeps every worker busy until the end, so the work divides evenly between them
+            return (sum(workers) + self.pending_total * correction) / len(workers)
+
+        heapq.heapify(workers)
+        for estimate in self.pending.values():
+            heapq.heappush(workers, heapq.heappop(workers) + estimate * correction)
+        return max(workers)
+
+
+def backtest_eta(store=None) -> list[tuple[str, float, float]]:
+    """Predicts every finished run from the durations recorded before it, as (run id, predicted, actual seconds)."""
+    store = store or history.get_store()
+    results = []
+    for run_id, started, ended, concurrency in store.finished_runs():
+        packages = store.run_packages(run_id)
+        if not packages:
+            continue
+        durations = DurationHistory(store.recent_durations(DURATIONS_KEPT, before=started))
+        predicted, _ = simulate_schedule(durations.estimate_all_keys(packages), concurrency or 1)
+        results.append((run_id, predicted, ended - started))
+    return results
+
+
+def compare_policies(durations, concurrency) -> dict:
+    """Simulates every policy on the same durations, returning {policy: (makespan, mean completion time)}."""
+    ordered = {
+        LIST_ORDER: list(durations),
+        SHORTEST_FIRST: sorted(durations),
+        LONGEST_FIRST: sorted(durations, reverse=True),
+    }
+    return {policy: simulate_schedule(ordered[policy], concurrency) for policy in POLICIES}
+
+
+if __name__ == "__main__":
+    # Replays the recorded durations of every package under each policy
+    recorded = [statistics.median(recent) for recent in DurationHistory.load().durations.values() if recent]
+    if not recorded:
+        print(f"No durations recorded in {history.HISTORY_FILE} yet.")
+    for workers in (1, 2, 4, 8) if recorded else ():
+        for name, (makespan, mean_completion) in compare_policies(recorded, workers).items():
+            print(f"{workers} at once, {name:>14}: makespan {makespan:8.1f}s, mean completion {mean_completion:8.1f}s")
+
+    # How far off the ETA shown at the start of every recorded run was
+    backtest = backtest_eta()
+    for run_id, predicted, actual in backtest:
+        print(f"Run {run_id[:8]}: predicted {predicted:8.1f}s, took {actual:8.1f}s")
+    if any(actual > 0 for _, _, actual in backtest):
+        errors = [abs(predicted - actual) / actual for _, predicted, actual in backtest if actual > 0]
+        print(f"Mean absolute error of {len(backtest)} runs: {statistics.fmean(errors) * 100:.0f}%")
@@ -0,0 +1,40 @@
+import json
+import os
+
+# Constants
+APP_DATA_DIR = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "Software Updater")
+SETTINGS_FILE = os.path.join(APP_DATA_DIR, "settings.json")
+
+DEFAULT_SETTINGS = {
+    "inventory_cache_ttl": 3600,  # Seconds before the cached app list is refreshed in the background
+    "update_mode": "per_app",  # "per_app" or "batch", see the update modes in engine.py
+    "adaptive_concurrency": False,  # Whether the number of apps updated at once follows the system load
+    "update_timeout": 1800,  # Seconds a single app may take to update before winget is killed
+    "stall_timeout": 600,  # Seconds winget may go without printing anything new before it is killed
+    "schedule_policy": "list",  # "list", "shortest_first" or "longest_first", see the policies in scheduling.py
+}
+
+
+def load_settings() -> dict:
+    """Loads the app settings from settings.json in AppData, filling in defaults for missing keys."""
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            return {**DEFAULT_SETTINGS, **json.load(f)}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return dict(DEFAULT_SETTINGS)
+
+
+def save_settings(settings: dict):
+    """Saves the app settings to settings.json in AppData."""
+    write_json_atomic(SETTINGS_FILE, settings)
+
+
+def write_json_atomic(path: str, data):
+    """Writes JSON to a temporary file and renames it over the target, so a crash never leaves a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,195 @@
+import atexit
+import contextlib
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import settings
+
+# Constants
+TRACE_ENV = "SOFTWARE_UPDATER_TRACE"  # Path of the trace file, or 1 for a new one in TRACES_DIR
+TRACES_DIR = os.path.join(settings.APP_DATA_DIR, "traces")
+CHROME_FORMAT = ".json"  # Trace event JSON for chrome://tracing or ui.perfetto.dev, any other extension is JSON lines
+
+
+class Span:
+    """A timed external call, with details like its exit code added while it runs."""
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set(self, **args):
+        """Adds details to the span."""
+        self.args.update(args)
+
+
+class NoSpan:
+    """Stands in for a span while tracing is off, so traced code never checks whether it is on."""
+
+    def set(self, **args):
+        pass
+
+
+NO_SPAN = contextlib.nullcontext(NoSpan())
+
+
+class Tracer:
+    """Collects the spans of a session in memory and writes them to a trace file when it ends."""
+
+    def __init__(self, path):
+        self.path = path
+        self.spans = []
+        self.lock = threading.Lock()  # Spans end in the update loop, the PowerShell host's callers and the GUI
+        self.origin = time.perf_counter()  # Trace timestamps count from here
+        self.wall_origin = time.time()
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        """Times the code in the with block as a span."""
+        span = Span(name, category, args)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            self.add(span)
+
+    def add(self, span):
+        """Keeps a finished span."""
+        with self.lock:
+            self.spans.append(span)
+
+    def get_lanes(self, spans) -> list[int]:
+        """Puts overlapping spans of the same category on separate rows of the timeline, reusing rows that are free."""
+        lanes = []
+        free = {}  # Per category, the end time and number of every row
+        counts = {}
+        for span in spans:
+            rows = free.setdefault(span.category, [])
+            if rows and rows[0][0] <= span.start:
+                _, lane = heapq.heappop(rows)
+            else:
+                lane = counts[span.category] = counts.get(span.category, 0) + 1
+            heapq.heappush(rows, (span.end, lane))
+            lanes.append(lane)
+        return lanes
+
+    def write_chrome_trace(self, file, spans):
+        """Writes complete ("X") trace events, with every category and row of it as a named thread."""
+        events = []
+        threads = {}
+        for span, lane in zip(spans, self.get_lanes(spans)):
+            thread_id = threads.setdefault((span.category, lane), len(threads) + 1)
+            events.append({"name": span.name, "cat": span.category, "ph": "X", "pid": os.getpid(), "tid": thread_id,
+                           "ts": (span.start - self.origin) * 1e6, "dur": (span.end - span.start) * 1e6,
+                           "args": span.args})
+        for (category, lane), thread_id in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id,
+                           "args": {"name": f"{category} {lane}"}})
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+    def write_jsonl(self, file, spans):
+        """Writes one JSON object per span, with its wall clock start and duration in seconds."""
+        for span in spans:
+            file.write(json.dumps({"name": span.name, "category": span.category,
+                                   "started": self.wall_origin + span.start - self.origin,
+                                   "seconds": span.end - span.start, **span.args}, default=str) + "\n")
+
+    def save(self):
+        """Writes every span so far to the trace file, in the format its extension asks for."""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as file:
+                if self.path.lower().endswith(CHROME_FORMAT):
+                    self.write_chrome_trace(file, spans)
+                else:
+                    self.write_jsonl(file, spans)
+            logging.info(f"Wrote {len(spans)} trace spans to {self.path}")
+        except OSError as e:
+            logging.error(f"Could not write the trace to {self.path}: {e}")
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def start_tracing(path=None) -> Tracer:
+    """Starts tracing the external calls of the session, written to path when it ends."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(path or os.path.join(TRACES_DIR, time.strftime("trace-%Y%m%d-%H%M%S") + CHROME_FORMAT))
+            atexit.register(shutdown_tracing)
+        elif path:
+            _tracer.path = path  # A path given on the command line wins over the environment
+        return _tracer
+
+
+def span(name, category, **args):
+    """A with block timed as a span of the trace. Does nothing while tracing is off."""
+    tracer = _tracer
+    if tracer is None:
+        return NO_SPAN
+    return tracer.span(name, category, **args)
+
+
+def add_span(name, category, start, end, **args):
+    """Records a span timed with time.perf_counter by the caller. Does nothing while tracing is off."""
+    tracer = _tracer
+    if tracer is None:
+        return
+    span = Span(name, category, args)
+    span.start, span.end = start, end
+    tracer.add(span)
+
+
+def is_enabled() -> bool:
+    """Whether spans are recorded, for callers whose details take time to collect."""
+    return _tracer is not None
+
+
+def shutdown_tracing():
+    """Writes the trace file and stops tracing, if it was started."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is not None:
+            _tracer.save()
+            _tracer = None
+
+
+# Tracing is usually turned on for the GUI from the environment, as it has no command line
+if os.environ.get(TRACE_ENV):
+    start_tracing(None if os.environ[TRACE_ENV] == "1" else os.environ[TRACE_ENV])
+
+
+if __name__ == "__main__":
+    # Overhead of a traced call while tracing is off and on, against the process spawn it is traced around
+    import subprocess
+    import sys
+    import timeit
+
+    CALLS = 100_000
+
+    def traced():
+        with span("call", "benchmark", command="x") as current:
+            current.set(exit_code=0)
+        add_span("call", "benchmark", 0.0, 1.0, exit_code=0)
+
+    _tracer = None
+    off = timeit.timeit(traced, number=CALLS) / CALLS
+    start_tracing(os.devnull)
+    on = timeit.timeit(traced, number=CALLS) / CALLS
+    _tracer = None
+    spawn = timeit.timeit(lambda: subprocess.run([sys.executable, "-c", "pass"]), number=10) / 10
+    print(f"Tracing off {off * 1e6:.2f}us, on {on * 1e6:.2f}us per call. "
+          f"Spawning a process takes {spawn * 1e3:.1f}ms, so tracing off costs {off / spawn * 100:.4f}% of it")
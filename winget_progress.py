@@ -0,0 +1,59 @@
+import re
+
+DOWNLOAD_WEIGHT = 80  # Share of an app's progress taken by its download, installers report no progress of their own
+
+# Progress lines redraw themselves, e.g. "  ██████▒▒▒▒  12.0 MB / 48.5 MB" or "  ██████▒▒▒▒  25%"
+SIZE = r"(\d+(?:\.\d+)?)\s*(B|KB|MB|GB|TB)"
+BYTE_COUNTER = re.compile(SIZE + r"\s*/\s*" + SIZE)
+PERCENTAGE = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*%")
+UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+INSTALL_STARTED = ("Successfully verified installer hash", "Starting package install")
+
+
+def parse_size(value, unit) -> int:
+    """Converts a size winget printed, like 12.5 MB, to bytes."""
+    return int(float(value) * UNITS[unit])
+
+
+class WingetProgressParser:
+    """Follows the decoded output of a single winget call and turns its progress lines into a 0-100 percentage."""
+
+    def __init__(self):
+        self.percent = 0
+        self.downloaded_bytes = 0
+        self.total_bytes = 0  # Size of the installer, once winget has printed it
+        self.installing = False
+        self.buffer = ""  # The line being printed, until it ends with a carriage return or newline
+
+    def feed(self, text) -> int | None:
+        """Parses a chunk of output. Returns the new percentage if it went up, otherwise None."""
+        self.buffer += text
+        *segments, self.buffer = re.split(r"[\r\n]", self.buffer)
+        old_percent = self.percent
+        for segment in segments:
+            self.parse_segment(segment.strip())
+        return self.percent if self.percent > old_percent else None
+
+    def parse_segment(self, segment):
+        """Updates the progress from a single redraw of winget's progress line."""
+        if not segment:
+            return
+        if segment.startswith(INSTALL_STARTED):
+            self.installing = True
+            self.percent = max(self.percent, DOWNLOAD_WEIGHT)
+            return
+        if self.installing:
+            return
+
+        counter = BYTE_COUNTER.search(segment)
+        if counter:
+            self.downloaded_bytes = parse_size(*counter.group(1, 2))
+            self.total_bytes = parse_size(*counter.group(3, 4))
+            fraction = self.downloaded_bytes / self.total_bytes if self.total_bytes else 0
+        else:
+            percentage = PERCENTAGE.search(segment)
+            if not percentage:
+                return
+            fraction = float(percentage.group(1)) / 100
+
+        self.percent = max(self.percent, int(min(fraction, 1.0) * DOWNLOAD_WEIGHT))